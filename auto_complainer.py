@@ -1,26 +1,68 @@
 import os
 import re
+import functools
+import importlib.util
 import sys
 import subprocess
+import shlex
+import threading
+import queue
 from pathlib import Path
 import shutil
+import tempfile
 import platform
+import argparse
 
-def read_current_version():
-    """从pyproject.toml读取当前版本号 (格式: X.Y.Z)"""
+# 编译配置
+VERSION_FILE = "pyproject.toml"  # 版本号所在文件
+DEFAULT_VERSION = "7.12.1"  # 无法读取版本号时的默认值
+SOURCE_FILE = Path("./biliFAV.py")  # 编译源文件
+EXE_DIR = Path("./exe")  # 可执行文件输出目录
+OUTPUT_NAME_TEMPLATE = "biliFAV_win_x64_{version}.exe"  # 输出文件名模板
+
+# 预编译的版本号正则
+_VERSION_RE = re.compile(r"^\d+\.\d+\.\d+$")
+_VERSION_ASSIGN_RE = re.compile(r'version\s*=\s*"([^"]+)"')
+_VERSION_REPLACE_RE = re.compile(r'version\s*=\s*"[^"]+"')
+
+# 固定不变的Nuitka编译参数
+_STATIC_NUITKA_ARGS = (
+    "--onefile",
+    "--standalone",
+    "--windows-product-name=Bilibili Favorite Downloader",
+    "--windows-file-description=Bilibili favorite video downloader with QR code login, SQLite database, and FFmpeg audio/video merging",
+    "--follow-imports",
+    #"--clang",
+    "--msvc=latest",
+    "--lto=yes",
+    "--assume-yes-for-downloads",  # 自动下载依赖工具，避免交互提示
+    "--python-flag=no_asserts",  # 去除assert语句
+    "--python-flag=no_docstrings",  # 去除文档字符串，减小可执行文件体积
+    "--python-flag=isolated",  # 忽略PYTHONPATH等环境变量
+    #"--remove-output",
+)
+
+def load_version_file(path=VERSION_FILE):
+    """读取pyproject.toml内容及当前版本号 (格式: X.Y.Z)，返回 (文件内容, 版本号)"""
     try:
-        with open("pyproject.toml", "r", encoding="utf-8") as f:
+        with open(path, "r", encoding="utf-8") as f:
             content = f.read()
-            # 使用正则表达式匹配版本号
-            match = re.search(r'version\s*=\s*"([^"]+)"', content)
-            if match:
-                version = match.group(1)
-                if validate_version_format(version):
-                    return version
     except FileNotFoundError:
-        pass
+        # 默认版本号
+        return None, DEFAULT_VERSION
+
+    # 使用正则表达式匹配版本号
+    match = _VERSION_ASSIGN_RE.search(content)
+    if match:
+        version = match.group(1)
+        if validate_version_format(version):
+            return content, version
     # 默认版本号
-    return "7.12.1"
+    return content, DEFAULT_VERSION
+
+def read_current_version():
+    """从pyproject.toml读取当前版本号 (格式: X.Y.Z)"""
+    return load_version_file()[1]
 
 def increment_version(version):
     """版本号自增 (格式: X.Y.Z)"""
@@ -30,42 +72,61 @@ def increment_version(version):
 
 def validate_version_format(version):
     """验证版本号格式是否正确"""
-    return bool(re.match(r"^\d+\.\d+\.\d+$", version))
+    return _VERSION_RE.match(version) is not None
 
-def write_new_version(version):
-    """写入新版本号到pyproject.toml"""
+def write_new_version(version, expected_version=None, path=VERSION_FILE):
+    """
+    写入新版本号到pyproject.toml
+    写入时重新读取文件，保留编译期间对文件的其他修改 (如uv add更新依赖)
+    expected_version为编译前读取的版本号，文件中的版本号已被改动时放弃写入
+    返回是否已写入
+    """
     try:
-        with open("pyproject.toml", "r", encoding="utf-8") as f:
+        with open(path, "r", encoding="utf-8") as f:
             content = f.read()
+
+        if expected_version is not None:
+            match = _VERSION_ASSIGN_RE.search(content)
+            file_version = match.group(1) if match else None
+            if file_version != expected_version:
+                print(f"[!] 编译期间pyproject.toml版本号已被修改 (编译前 {expected_version}, 当前 {file_version})，放弃更新版本号")
+                return False
         
-        # 替换版本号
-        new_content = re.sub(
-            r'version\s*=\s*"[^"]+"',
-            f'version = "{version}"',
-            content
-        )
+        # 替换版本号 (仅替换第一处，即[project]中的version)
+        new_content = _VERSION_REPLACE_RE.sub(f'version = "{version}"', content, count=1)
         
-        with open("pyproject.toml", "w", encoding="utf-8") as f:
-            f.write(new_content)
+        # 先写入同目录下的临时文件再原子替换，避免中断时损坏原文件
+        dir_path = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(prefix=".pyproject.", dir=dir_path, text=True)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(new_content)
+            # mkstemp创建的文件权限为0600，替换前沿用原文件的权限
+            if os.path.exists(path):
+                shutil.copymode(path, tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
         
         print(f"[✓] 已更新pyproject.toml版本号为: {version}")
+        return True
     except Exception as e:
         print(f"[!] 更新pyproject.toml版本号失败: {str(e)}")
         raise
 
+@functools.lru_cache(maxsize=1)
 def find_nuitka():
-    """尝试找到nuitka可执行文件路径"""
-    try:
-        subprocess.check_call(["nuitka", "--version"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        return "nuitka"
-    except (subprocess.CalledProcessError, FileNotFoundError):
-        pass
+    """尝试找到nuitka可执行文件路径 (结果在进程内缓存)"""
+    # 优先在PATH中查找，无需启动子进程
+    nuitka_path = shutil.which("nuitka")
+    if nuitka_path:
+        return nuitka_path
     
-    try:
-        subprocess.check_call([sys.executable, "-m", "nuitka", "--version"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    # 检查当前解释器是否安装了nuitka模块，可通过 python -m nuitka 调用
+    if importlib.util.find_spec("nuitka") is not None:
         return [sys.executable, "-m", "nuitka"]
-    except (subprocess.CalledProcessError, FileNotFoundError):
-        pass
     
     python_dir = os.path.dirname(sys.executable)
     nuitka_path = os.path.join(python_dir, "nuitka")
@@ -77,88 +138,123 @@ def find_nuitka():
     
     raise FileNotFoundError("无法找到nuitka可执行文件。请确保已安装Nuitka (pip install nuitka)")
 
-def run_nuitka(current_version, new_version):
-    """执行Nuitka编译命令"""
-    source_file = "./biliFAV.py"
-    if not Path(source_file).exists():
-        raise FileNotFoundError(f"源文件 {source_file} 不存在")
+def discard_directory(path):
+    """
+    将目录重命名为同级的临时名称后在后台线程中删除，调用方无需等待删除完成
+    删除线程为非守护线程，程序退出前会等待其结束，不会残留半删除的目录
+    """
+    if not path.exists():
+        return None
+    
+    # 同级目录下重命名只修改元数据，几乎瞬间完成
+    trash_dir = path.with_name(f".{path.name}.{os.getpid()}.trash")
+    try:
+        os.replace(path, trash_dir)
+    except OSError:
+        # 重命名失败（如文件被占用）时直接删除原目录
+        trash_dir = path
+    
+    thread = threading.Thread(
+        target=shutil.rmtree, args=(trash_dir,), kwargs={"ignore_errors": True}
+    )
+    thread.start()
+    return thread
+
+def run_nuitka(current_version, new_version, verbose=False):
+    """执行Nuitka编译命令 (verbose为True时显示Nuitka详细进度)"""
+    if not SOURCE_FILE.exists():
+        raise FileNotFoundError(f"源文件 {SOURCE_FILE} 不存在")
 
     # 创建输出目录
-    exe_dir = Path("./exe")
-    exe_dir.mkdir(parents=True, exist_ok=True)
+    EXE_DIR.mkdir(parents=True, exist_ok=True)
     
     # 生成带新版本号的输出文件名
-    output_filename = f"biliFAV_win_x64_{new_version}.exe"
+    output_filename = OUTPUT_NAME_TEMPLATE.format(version=new_version)
     
     # 获取nuitka命令
     nuitka_cmd = find_nuitka()
-    if isinstance(nuitka_cmd, list):
-        cmd = nuitka_cmd
-    else:
-        cmd = [nuitka_cmd]
+    base_cmd = nuitka_cmd if isinstance(nuitka_cmd, list) else [nuitka_cmd]
     
     # 设置中文编码环境
     env = os.environ.copy()
     env["PYTHONIOENCODING"] = "utf-8"
     env["PYTHONUTF8"] = "1"
     
-    # 添加编译参数
-    cmd.extend([
-        "--onefile",
-        "--standalone",
-        f"--output-dir={exe_dir}",
+    # 组合编译参数：仅输出路径、版本号和并行数随每次编译变化
+    cmd = [
+        *base_cmd,
+        f"--output-dir={EXE_DIR}",
         f"--output-filename={output_filename}",
-        "--windows-product-name=Bilibili Favorite Downloader",
         f"--windows-product-version={new_version}",  # 使用新版本号
-        "--windows-file-description=Bilibili favorite video downloader with QR code login, SQLite database, and FFmpeg audio/video merging",
-        "--follow-imports",
-        #"--clang",
-        "--msvc=latest",
-        "--lto=yes",
-        "--show-progress",
-        #"--remove-output",
-        source_file
-    ])
+        f"--jobs={os.cpu_count() or 4}",  # 使用全部CPU核心并行编译
+        *_STATIC_NUITKA_ARGS,
+    ]
+    
+    # 仅在详细模式下输出逐项进度，减少非交互构建的日志量
+    if verbose:
+        cmd.append("--show-progress")
+    
+    cmd.append(str(SOURCE_FILE))
 
     # 执行命令并实时输出
-    print("执行命令:", " ".join(cmd),f"\n")
+    print("执行命令:", shlex.join(cmd),f"\n")
     
     process = subprocess.Popen(
         cmd,
         stdout=subprocess.PIPE,
         stderr=subprocess.STDOUT,
-        text=True,
-        encoding="utf-8",
-        errors="replace",
-        bufsize=1,
-        universal_newlines=True,
+        bufsize=65536,  # 使用大缓冲区，减少系统调用次数
         env=env  # 传递编码环境
     )
 
+    # 后台线程读取管道输出，主线程可及时响应Ctrl+C
+    # 输出保持为字节，直接写入终端缓冲区，省去解码/再编码
+    output_queue = queue.Queue()
+    stdout_buffer = sys.stdout.buffer
+    sys.stdout.flush()
+
+    def pump_output():
+        # 直接迭代管道，由文件对象内部缓冲按块读取
+        for line in process.stdout:
+            output_queue.put(line)
+        output_queue.put(None)  # 输出结束标记
+
+    threading.Thread(target=pump_output, daemon=True).start()
+
     try:
         while True:
-            output = process.stdout.readline()
-            if output == '' and process.poll() is not None:
+            try:
+                # 带超时等待，使主线程定期醒来处理Ctrl+C
+                output = output_queue.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            if output is None:
                 break
-            if output:
-                print(output.strip())
-        return process.poll()
+            stdout_buffer.write(output)
+            # 队列暂时为空时再刷新，合并连续输出的写入
+            if output_queue.empty():
+                stdout_buffer.flush()
+        stdout_buffer.flush()
+        return process.wait()
     except KeyboardInterrupt:
         print("\n[!] 检测到中断信号，终止编译过程...")
         process.terminate()
         return 1
     finally:
-        # 清理临时目录
-        build_dir = Path("./biliFAV.build")
-        if build_dir.exists():
-            shutil.rmtree(build_dir, ignore_errors=True)
-        dist_dir = Path("./biliFAV.dist")
-        if dist_dir.exists():
-            shutil.rmtree(dist_dir, ignore_errors=True)
+        # 清理临时目录 (重命名后在后台并行删除，不阻塞后续流程)
+        for suffix in (".build", ".dist"):
+            discard_directory(SOURCE_FILE.with_suffix(suffix))
+
+def parse_arguments():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="BiliFAV 自动编译脚本")
+    parser.add_argument("--verbose", action="store_true", help="显示Nuitka详细编译进度")
+    return parser.parse_args()
 
 def main():
+    args = parse_arguments()
     try:
-        # 读取当前版本号
+        # 读取当前版本号 (编译成功后写回前会重新读取文件并核对)
         current_version = read_current_version()
         
         # 验证版本格式
@@ -173,14 +269,16 @@ def main():
         print(f"将编译为新版本: {new_version}\n")
 
         # 执行编译（使用新版本号）
-        exit_code = run_nuitka(current_version, new_version)
+        exit_code = run_nuitka(current_version, new_version, args.verbose)
         
         if exit_code == 0:
             print(f"\n[✓] 编译成功，更新版本号为: {new_version}")
-            write_new_version(new_version)
+            if not write_new_version(new_version, current_version):
+                print(f"请手动将版本号更新为: {new_version}")
+                sys.exit(1)
             
             # 显示输出文件路径
-            exe_path = Path("./exe") / f"biliFAV_win_x64_{new_version}.exe"
+            exe_path = EXE_DIR / OUTPUT_NAME_TEMPLATE.format(version=new_version)
             print(f"已生成可执行文件: {exe_path}")
             
             # 验证版本更新
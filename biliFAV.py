@@ -11,37 +11,69 @@ import toml
 import qrcode
 import sqlite3
 import time
-import random
 import json
+import math
 import os
 import signal
 import sys
-import io
-import threading
 import argparse
 from pathlib import Path
+from urllib.parse import urlsplit
 from typing import Optional, Dict, List, Tuple, Any, Callable
 import httpx
 import concurrent.futures
 import re
 import logging
 from datetime import datetime, timedelta
+from functools import lru_cache
 from tqdm import tqdm  # 进度条显示
 import ffmpeg
 import shutil
 import subprocess
+import threading
+import platform
+from collections import Counter, defaultdict
+
+try:
+    import tomllib  # Python 3.11+ 标准库，仅支持读取
+except ImportError:
+    tomllib = None
+
+try:
+    import orjson  # 可选依赖，未安装时回退到标准库json
+except ImportError:
+    orjson = None
+
+try:
+    import h2  # 可选依赖，安装后下载连接启用HTTP/2多路复用
+
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
 
 # ========================
 # 系统设置与初始化
 # ========================
 
 # 设置系统默认编码为UTF-8，确保中文显示正常
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8")
-sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding="utf-8")
+# 直接重新配置现有流，避免再包一层TextIOWrapper并保留原有的行缓冲模式
+# 已是UTF-8的流 (Linux/macOS终端通常如此) 无需处理
+for _stream in (sys.stdout, sys.stderr):
+    if (
+        hasattr(_stream, "reconfigure")
+        and (_stream.encoding or "").lower().replace("-", "") != "utf8"
+    ):
+        _stream.reconfigure(encoding="utf-8")
 
 # 配置日志系统
+# 不记录线程/进程信息，省去每条日志记录的额外查询
+logging.logThreads = False
+logging.logProcesses = False
+logging.logMultiprocessing = False
+
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
+# 与控制台处理器级别保持一致，低于WARNING的日志在创建记录前即被丢弃
+logger.setLevel(logging.WARNING)
 
 # 减少HTTPX库的日志输出级别
 httpx_logger = logging.getLogger("httpx")
@@ -63,6 +95,52 @@ logger.propagate = False  # 防止日志传递给父记录器
 # 配置文件路径
 TOKEN_FILE = "bili_token.toml"  # 保存登录token的文件
 DB_FILE = ".get_my_favourite.sqlite"  # SQLite数据库文件
+FFMPEG_CACHE_FILE = ".ffmpeg_cache.toml"  # 缓存FFmpeg检测结果的文件
+MEMBER_STATUS_TTL = 6 * 3600  # 大会员状态缓存有效期(秒)
+LOGIN_COOKIE_NAMES = ("SESSDATA", "bili_jct", "DedeUserID")  # 登录后需要保存的cookies
+QR_LOGIN_TIMEOUT = 180  # 二维码有效期(秒)
+QR_POLL_MAX_INTERVAL = 5.0  # 二维码状态轮询最长间隔(秒)
+API_RATE_LIMIT = 5  # 收藏夹内容接口每秒最多请求数
+MAX_FAVORITE_FETCHES = 8  # 同时获取内容的收藏夹数上限 (总请求速率仍受API_RATE_LIMIT限制)
+NOT_LOGGED_IN_CODE = -101  # API返回的"账号未登录"错误码
+
+# 数据库查询索引 (索引名, 创建语句)
+DB_INDEXES = (
+    (
+        "idx_items_fav",
+        "CREATE INDEX IF NOT EXISTS idx_items_fav ON favorite_items(favorite_id)",
+    ),
+    (
+        "idx_favorites_last_updated",
+        "CREATE INDEX IF NOT EXISTS idx_favorites_last_updated ON favorites(last_updated)",
+    ),
+)
+
+# 保存收藏夹数据时反复执行的SQL语句
+# 始终使用同一字符串对象执行，命中sqlite3的预编译语句缓存
+SQL_UPSERT_FAVORITE = """
+INSERT INTO favorites (id, title, media_id, count, last_updated)
+VALUES (?, ?, ?, ?, ?)
+ON CONFLICT(id) DO UPDATE SET
+    title=excluded.title,
+    count=excluded.count,
+    last_updated=excluded.last_updated
+"""
+SQL_DELETE_FAVORITE_ITEMS = (
+    "DELETE FROM favorite_items WHERE favorite_id IN ({placeholders})"
+)
+SQL_MAX_IN_PARAMS = 500  # 单条IN语句的参数上限 (低于SQLite的变量数限制)
+SQL_INSERT_FAVORITE_ITEM = (
+    "INSERT INTO favorite_items "
+    "(id, favorite_id, title, bvid, owner_name, page_count, cid, duration) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
+# 从数据库加载收藏夹数据的SQL语句 (同样复用预编译语句缓存)
+SQL_SELECT_FAVORITES = "SELECT id, title, media_id, count, last_updated FROM favorites"
+SQL_SELECT_ALL_FAVORITE_ITEMS = (
+    "SELECT favorite_id, title, bvid, owner_name FROM favorite_items"
+)
 
 # HTTP请求头配置
 HEADERS = {
@@ -83,22 +161,71 @@ QUALITY_MAP = {
     "最低": 6,  # 最低清晰度
 }
 
-# 清晰度代码到描述的映射 (代码 -> 清晰度描述)
-QUALITY_CODE_TO_DESC = {
-    120: "4K",
-    112: "1080P60",
-    116: "1080P+",
-    80: "1080P",
-    74: "720P60",
-    64: "720P",
-    32: "480P",
-    16: "360P",
-    6: "最低",
-}
+# 清晰度代码到描述的映射 (代码 -> 清晰度描述)，由QUALITY_MAP反转生成以保持同步
+QUALITY_CODE_TO_DESC = {code: desc for desc, code in QUALITY_MAP.items()}
+
+# 交互选择清晰度时的选项列表及默认选项序号 (从1开始)
+QUALITY_OPTIONS = tuple(QUALITY_MAP)
+DEFAULT_QUALITY_INDEX = (
+    QUALITY_OPTIONS.index("1080P") + 1 if "1080P" in QUALITY_OPTIONS else 4
+)
+# 清晰度选项菜单文本 (一次生成，显示时一次输出)
+QUALITY_MENU = "\n可用清晰度:\n" + "\n".join(
+    f"{i}. {q}" for i, q in enumerate(QUALITY_OPTIONS, 1)
+)
+
+# 同时进行的FFmpeg合并任务数上限 (每个FFmpeg进程单线程运行，避免互相争抢CPU)
+# 流复制合并主要受磁盘I/O限制，单核机器上也至少同时进行2个
+MAX_MERGE_WORKERS = max(2, min(os.cpu_count() or 1, 4))
+
+# 合并队列积压时单个FFmpeg进程最多合并的视频数 (多输入多输出，减少进程启动开销)
+MERGE_BATCH_SIZE = 8
+
+# 多分P视频同时下载的分P数上限
+MAX_PART_DOWNLOADS = 3
+
+# 下载收藏夹时提前获取分P信息的视频数
+VIDEO_PREFETCH_COUNT = 4
+
+# 下载文件时每次读取的数据块大小 (较大的数据块减少循环和进度条刷新次数)
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024  # 1MB
+
+# 下载临时文件旁记录续传校验信息(流标识、总大小、ETag)的文件后缀
+RESUME_INFO_SUFFIX = ".resume"
+
+# 下载进度条的最短更新间隔(秒)
+PROGRESS_UPDATE_INTERVAL = 0.1
 
 # 非大会员账号可下载的最高清晰度代码
 NON_MEMBER_MAX_QUALITY = 80  # 1080P
 
+# 不使用DASH格式的清晰度代码 (16=360P, 6=最低)
+_FLV_QUALITIES = frozenset((16, 6))
+
+# 当前平台是否为Windows
+IS_WINDOWS = platform.system() == "Windows"
+
+# 启动子进程的额外参数 (Windows下不弹出控制台窗口，其他平台无需额外参数)
+_SUBPROC_KWARGS = {"creationflags": subprocess.CREATE_NO_WINDOW} if IS_WINDOWS else {}
+
+# 程序目录中可识别的FFmpeg可执行文件名 (小写)
+_FFMPEG_NAMES = frozenset(("ffmpeg", "ffmpeg.exe", "ffmpeg.bat"))
+
+# FFmpeg -version 输出首行中的版本号
+_FFMPEG_VER_RE = re.compile(r"\S+ version (\S+)")
+
+# 分P选择输入的整体格式 (逗号分隔的数字或范围，允许空项) 及其中的单项
+_PAGE_SELECTION_RE = re.compile(r"(?:\d+(?:-\d+)?)?(?:,(?:\d+(?:-\d+)?)?)*")
+_PAGE_RANGE_RE = re.compile(r"(\d+)(?:-(\d+))?")
+# 分隔符(逗号、连字符)两侧的空白
+_PAGE_SEP_SPACE_RE = re.compile(r"\s*([,-])\s*")
+
+# 用户输入(链接等)中的BV号
+_BVID_RE = re.compile(r"BV[a-zA-Z0-9]{10,}")
+
+# 文件名非法字符删除表 (Windows文件系统不允许的字符: <>:"/\\|?*)
+_FILENAME_STRIP_TABLE = str.maketrans("", "", '<>:"/\\|?*')
+
 # ========================
 # 全局状态变量
 # ========================
@@ -112,6 +239,81 @@ skip_existing = False  # 跳过所有已存在文件标志
 # ========================
 
 
+def load_toml_file(path: str) -> Dict:
+    """
+    读取TOML文件
+    优先使用标准库tomllib，Python 3.10下回退到toml库
+    参数:
+        path: TOML文件路径
+    返回:
+        解析后的字典
+    """
+    if tomllib is not None:
+        with open(path, "rb") as f:
+            return tomllib.load(f)
+    return toml.load(path)
+
+
+async def ainput(prompt: str = "") -> str:
+    """
+    异步读取一行用户输入
+    在后台守护线程中等待输入，等待期间事件循环继续处理下载与合并任务
+    (使用守护线程而非默认线程池，程序退出时不会因等待输入而卡住)
+    参数:
+        prompt: 输入提示
+    返回:
+        用户输入的字符串(不含换行)
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def set_result(result, error):
+        # 等待方已取消时忽略结果
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def read_line():
+        try:
+            result, error = input(prompt), None
+        except Exception as e:  # 如EOFError
+            result, error = None, e
+        loop.call_soon_threadsafe(set_result, result, error)
+
+    threading.Thread(target=read_line, daemon=True).start()
+    return await future
+
+
+def write_fully(f, data: bytes) -> None:
+    """
+    将数据完整写入无缓冲文件
+    无缓冲文件的write可能只写入部分数据，循环写入直到全部完成
+    参数:
+        f: 以buffering=0打开的文件对象
+        data: 要写入的数据
+    """
+    view = memoryview(data)
+    while view:
+        view = view[f.write(view) :]
+
+
+def parse_json(content: bytes) -> Any:
+    """
+    解析API响应的JSON内容
+    优先使用orjson，未安装时回退到标准库json
+    参数:
+        content: 响应体原始字节
+    返回:
+        解析后的对象
+    """
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
 def signal_handler(sig, frame):
     """处理系统中断信号(Ctrl+C)"""
     global interrupted
@@ -124,6 +326,7 @@ def signal_handler(sig, frame):
 signal.signal(signal.SIGINT, signal_handler)
 
 
+@lru_cache(maxsize=8192)
 def sanitize_filename(filename: str) -> str:
     """
     清理文件名中的非法字符，但保留emoji
@@ -133,12 +336,15 @@ def sanitize_filename(filename: str) -> str:
         清理后的安全文件名
     """
     # 移除Windows文件系统不允许的字符: <>:"/\\|?*
-    return re.sub(r'[<>:"/\\|?*]', "", filename)
+    return filename.translate(_FILENAME_STRIP_TABLE)
 
 
+@lru_cache(maxsize=8192)
 def shorten_filename(filename: str, max_length: int = 180) -> str:
     """
     缩短文件名以防止路径过长
+    结果会被缓存，同一次运行中相同文件名得到相同的随机后缀，
+    保证已存在文件检查与实际下载使用同一路径
     参数:
         filename: 原始文件名
         max_length: 最大允许长度(默认180)
@@ -152,11 +358,63 @@ def shorten_filename(filename: str, max_length: int = 180) -> str:
     name, ext = os.path.splitext(filename)
     # 截断文件名主体部分
     name = name[: max_length - len(ext) - 10]  # 保留10字符给随机后缀
-    # 生成8位随机后缀防止冲突
-    suffix = "".join(random.choices("abcdefghijklmnopqrstuvwxyz1234567890", k=8))
+    # 生成8位随机十六进制后缀防止冲突
+    suffix = os.urandom(4).hex()
     return f"{name}_{suffix}{ext}"
 
 
+@lru_cache(maxsize=8192)
+def safe_filename(title: str) -> str:
+    """
+    由视频标题生成可用的文件名 (清理非法字符后按需缩短)
+    调用方只需一次缓存查询即可得到结果
+    参数:
+        title: 视频或分P标题
+    返回:
+        安全的文件名
+    """
+    return shorten_filename(sanitize_filename(title))
+
+
+class AsyncRateLimiter:
+    """
+    异步令牌桶限速器
+    令牌按固定速率补充，有剩余令牌时请求无需等待，超出速率时才排队等待
+    参数:
+        rate: 每个周期允许的请求数(同时也是允许的突发请求数)
+        period: 周期长度(秒)
+    """
+
+    def __init__(self, rate: float, period: float = 1.0):
+        self.capacity = rate
+        self.fill_rate = rate / period  # 每秒补充的令牌数
+        self.tokens = rate
+        self.last_refill = time.monotonic()
+        self._lock = asyncio.Lock()  # 保证等待者按顺序获取令牌
+
+    async def acquire(self):
+        """获取一个令牌，令牌不足时等待补充"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity,
+                    self.tokens + (now - self.last_refill) * self.fill_rate,
+                )
+                self.last_refill = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.fill_rate)
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+
 # ========================
 # 主下载器类
 # ========================
@@ -170,19 +428,30 @@ class BiliFavDownloader:
         self.cookies = {}  # 存储登录cookies
         self.token_data = {}  # 存储登录token数据
         self.all_data = []  # 存储所有收藏夹数据
+        self._folders_by_id = {}  # 收藏夹ID -> all_data中的收藏夹数据
         self.db_exists = Path(DB_FILE).exists()  # 数据库文件是否存在
         self.is_member = False  # 用户是否为大会员
         self.qr_file = None  # 二维码保存路径(默认不保存)
         self.ffmpeg_available = False  # FFmpeg是否可用
         self.ffmpeg_version = "未知"  # FFmpeg版本信息
         self.ffmpeg_path = None  # FFmpeg可执行文件路径
-        self.merge_queue = []  # 音视频合并任务队列
-        self.merge_lock = threading.Lock()  # 合并队列的线程锁
-        self.merge_thread = None  # 合并线程对象
-        self.merge_running = True  # 合并线程运行标志
+        self.merge_queue = asyncio.Queue()  # 音视频合并任务队列
+        self.merge_semaphore = asyncio.Semaphore(MAX_MERGE_WORKERS)  # 限制同时进行的合并数
+        self.merge_task = None  # 合并调度任务对象
+        self.merge_jobs = set()  # 正在进行的合并任务
         self.last_updated = None  # 数据库最后更新时间
         self.current_update_time = None  # 当前更新时间
         self.first_run = not self.db_exists  # 是否首次运行标志
+        self._db = None  # 复用的数据库连接(首次使用时打开)
+        self._db_lock = threading.Lock()  # 共享数据库连接的访问锁(写入在后台线程中进行)
+        self._schema_ready = False  # 本次运行中数据库结构是否已检查/升级
+        self._favorite_videos_cache = {}  # 收藏夹视频列表缓存 (收藏夹ID -> (标题, 视频列表))
+        self.client = None  # 共享的HTTP客户端(初始化时创建)
+        self.download_client = None  # 文件下载专用的HTTP客户端(初始化时创建)
+        self._download_headers = None  # 缓存的下载请求头(首次下载时生成)
+        self.api_limiter = AsyncRateLimiter(API_RATE_LIMIT)  # 收藏夹接口请求限速
+        self._relogin_lock = asyncio.Lock()  # 保证登录失效时只进行一次重新登录
+        self._relogin_failed = False  # 重新登录是否已失败(失败后不再重复弹出二维码)
 
     async def initialize(self) -> bool:
         """
@@ -192,13 +461,37 @@ class BiliFavDownloader:
           2. 检查并加载token
           3. 二维码登录(如果需要)
           4. 检查会员状态
-          5. 启动合并线程
+          5. 启动合并任务
           6. 获取数据库最后更新时间
         返回:
             bool: 初始化是否成功
         """
         global interrupted
 
+        # 创建共享的HTTP客户端，所有API请求复用同一连接池
+        # 安装h2时启用HTTP/2，并发的API请求在同一连接上多路复用
+        self.client = httpx.AsyncClient(
+            headers=HEADERS,
+            http2=HTTP2_AVAILABLE,
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=50),
+            timeout=httpx.Timeout(30.0, connect=5.0),
+        )
+        # 音视频文件下载使用独立的连接池，同一CDN的多个文件复用连接，避免每个文件重新握手
+        # 自定义transport时连接池参数需在transport上设置，建立连接失败时自动重试
+        self.download_client = httpx.AsyncClient(
+            headers=HEADERS,
+            timeout=httpx.Timeout(60.0, connect=10.0),
+            transport=httpx.AsyncHTTPTransport(
+                http2=HTTP2_AVAILABLE,
+                limits=httpx.Limits(
+                    max_keepalive_connections=64,
+                    max_connections=128,
+                    keepalive_expiry=30.0,
+                ),
+                retries=2,
+            ),
+        )
+
         # 1. 检查FFmpeg是否可用
         self.check_ffmpeg()
 
@@ -219,7 +512,7 @@ class BiliFavDownloader:
 
         # 设置cookies
         if self.token_data:
-            self.cookies = self.token_data["cookies"]
+            self._apply_token(self.token_data)
 
         # 4. 检查会员状态
         if self.cookies:
@@ -237,14 +530,88 @@ class BiliFavDownloader:
                 print("默认使用普通账号模式")
                 self.is_member = False
 
-        # 5. 启动合并线程
-        self.start_merge_thread()
+        # 5. 启动合并任务
+        self.start_merge_worker()
 
         # 6. 获取数据库最后更新时间
         self.get_last_updated_time()
 
         return True
 
+    def _apply_token(self, token_data: Dict):
+        """
+        使用token中的cookies替换HTTP客户端的cookies
+        登录轮询的响应会把带域名的同名cookies写入客户端，先清空避免同名cookies冲突
+        """
+        self.cookies = token_data["cookies"]
+        self.client.cookies.clear()
+        self.client.cookies.update(self.cookies)
+        self._download_headers = None  # 登录信息变化，重新生成下载请求头
+
+    def _get_download_headers(self, session: httpx.AsyncClient) -> Dict:
+        """
+        获取下载音视频文件的请求头
+        Cookie头只在首次调用或登录信息变化后生成一次，之后直接复用
+        """
+        if self._download_headers is None:
+            self._download_headers = {
+                "User-Agent": HEADERS["User-Agent"],
+                "Referer": "https://www.bilibili.com",
+                "Cookie": "; ".join(
+                    [f"{k}={v}" for k, v in session.cookies.items()]
+                ),
+            }
+        return self._download_headers
+
+    async def _relogin(self) -> Optional[Dict]:
+        """
+        登录失效时重新扫码登录
+        多个并发请求同时发现登录失效时只扫码一次，其余请求等待后直接复用新的登录信息
+        返回:
+            Dict: 新的token数据，登录失败时返回None
+        """
+        async with self._relogin_lock:
+            if self._relogin_failed:
+                return None
+
+            # 等待期间其他请求已完成重新登录，直接复用
+            if (
+                self.token_data
+                and time.time() - self.token_data.get("timestamp", 0) < 60
+            ):
+                return self.token_data
+
+            print("\n登录已失效，需要重新登录...")
+            token_data = await self.qr_login()
+            if not token_data:
+                self._relogin_failed = True
+                return None
+
+            self.token_data = token_data
+            self.save_token(token_data)
+            self._apply_token(token_data)
+            return token_data
+
+    def _get_db(self) -> sqlite3.Connection:
+        """
+        获取数据库连接，首次调用时打开并设置性能参数，之后所有数据库操作复用同一连接
+        连接在close()中关闭
+        """
+        if self._db is None:
+            self._db = sqlite3.connect(
+                DB_FILE, check_same_thread=False, cached_statements=256
+            )
+            self._db.executescript(
+                """
+                PRAGMA journal_mode=WAL;
+                PRAGMA synchronous=NORMAL;
+                PRAGMA temp_store=MEMORY;
+                PRAGMA cache_size=-65536;
+                PRAGMA busy_timeout=5000;
+                """
+            )
+        return self._db
+
     def get_last_updated_time(self):
         """从数据库获取最后更新时间"""
         if not self.db_exists:
@@ -252,37 +619,39 @@ class BiliFavDownloader:
             return
 
         try:
-            conn = sqlite3.connect(DB_FILE)
-            c = conn.cursor()
-
-            # 检查表结构是否包含last_updated字段
-            c.execute("PRAGMA table_info(favorites)")
-            columns = [col[1] for col in c.fetchall()]
-            if "last_updated" not in columns:
-                self.last_updated = None
-                return
-
-            # 查询最后更新时间
-            c.execute("SELECT MAX(last_updated) FROM favorites")
-            result = c.fetchone()
-            if result and result[0]:
-                self.last_updated = datetime.fromisoformat(result[0])
+            # 共享连接可能正被后台线程写入，读取同样需要持锁
+            with self._db_lock:
+                row = (
+                    self._get_db()
+                    .execute("SELECT MAX(last_updated) FROM favorites")
+                    .fetchone()
+                )
+            if row and row[0]:
+                self.last_updated = datetime.fromisoformat(row[0])
             else:
                 self.last_updated = None
+        except sqlite3.OperationalError:
+            # 旧版数据库没有last_updated字段
+            self.last_updated = None
         except Exception as e:
             print(f"获取数据库最后更新时间失败: {str(e)}")
             self.last_updated = None
-        finally:
-            if conn:
-                conn.close()
 
     def check_ffmpeg(self):
         """检查系统上是否安装了FFmpeg，包括全局搜索和程序目录搜索"""
+        # 0. 优先使用上次检测的缓存结果
+        if self._load_ffmpeg_cache():
+            print(
+                f"FFmpeg检测成功 (缓存路径: {self.ffmpeg_path}, 版本: {self.ffmpeg_version})"
+            )
+            return
+
         # 1. 首先尝试全局搜索（系统PATH）
         global_ffmpeg_path = shutil.which("ffmpeg")
         if global_ffmpeg_path and self._test_ffmpeg_path(global_ffmpeg_path):
             self.ffmpeg_path = global_ffmpeg_path
             self.ffmpeg_available = True
+            self._save_ffmpeg_cache()
             print(
                 f"FFmpeg检测成功 (全局路径: {self.ffmpeg_path}, 版本: {self.ffmpeg_version})"
             )
@@ -294,44 +663,94 @@ class BiliFavDownloader:
         if local_ffmpeg_path and self._test_ffmpeg_path(local_ffmpeg_path):
             self.ffmpeg_path = local_ffmpeg_path
             self.ffmpeg_available = True
+            self._save_ffmpeg_cache()
             print(
                 f"FFmpeg检测成功 (程序目录: {self.ffmpeg_path}, 版本: {self.ffmpeg_version})"
             )
             return
 
-        # 3. 如果上述方法都失败，尝试直接运行ffmpeg命令
+        # 3. 所有方法都失败
+        print("警告: 未检测到FFmpeg，DASH格式视频将无法合并音频")
+        print("   请安装FFmpeg并添加到系统PATH，或放置在程序目录下")
+        print("   下载地址：https://ffmpeg.org/download.html")
+        self.ffmpeg_available = False
+
+    def _load_ffmpeg_cache(self) -> bool:
+        """
+        读取FFmpeg检测缓存
+        缓存记录的文件大小和修改时间与当前文件一致时直接使用，否则删除缓存
+        返回:
+            bool: 是否命中缓存
+        """
+        if not Path(FFMPEG_CACHE_FILE).exists():
+            return False
+
         try:
-            result = subprocess.run(
-                ["ffmpeg", "-version"],
-                capture_output=True,
-                text=True,
-                encoding="utf-8",
-                errors="ignore",
-                creationflags=subprocess.CREATE_NO_WINDOW,
-            )
-            if result.returncode == 0:
+            cache = load_toml_file(FFMPEG_CACHE_FILE)
+            path = cache["path"]
+            stat = os.stat(path)
+            if (
+                stat.st_mtime_ns == cache["mtime_ns"]
+                and stat.st_size == cache["size"]
+                and os.access(path, os.X_OK)
+            ):
+                self.ffmpeg_path = path
+                self.ffmpeg_version = cache.get("version", "未知")
                 self.ffmpeg_available = True
-                self.ffmpeg_path = "ffmpeg"  # 使用命令名称
-                self._parse_ffmpeg_version(result.stdout)
-                print(f"FFmpeg检测成功 (命令方式, 版本: {self.ffmpeg_version})")
-                return
+                return True
         except Exception:
             pass
 
-        # 4. 所有方法都失败
-        print("警告: 未检测到FFmpeg，DASH格式视频将无法合并音频")
-        print("   请安装FFmpeg并添加到系统PATH，或放置在程序目录下")
-        print("   下载地址：https://ffmpeg.org/download.html")
-        self.ffmpeg_available = False
+        # 缓存无效，删除后重新检测
+        try:
+            os.remove(FFMPEG_CACHE_FILE)
+        except OSError:
+            pass
+        return False
 
-    def _find_ffmpeg_in_directory(self, directory: str) -> Optional[str]:
-        """在指定目录中搜索FFmpeg可执行文件"""
-        ffmpeg_names = ["ffmpeg", "ffmpeg.exe", "ffmpeg.bat"]
+    def _save_ffmpeg_cache(self):
+        """将FFmpeg检测结果写入缓存文件"""
+        try:
+            stat = os.stat(self.ffmpeg_path)
+            cache = {
+                "path": self.ffmpeg_path,
+                "version": self.ffmpeg_version,
+                "mtime_ns": stat.st_mtime_ns,
+                "size": stat.st_size,
+            }
+            # 先写临时文件再替换，避免写入中断产生损坏的缓存
+            tmp_file = f"{FFMPEG_CACHE_FILE}.tmp"
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                toml.dump(cache, f)
+            os.replace(tmp_file, FFMPEG_CACHE_FILE)
+        except Exception:
+            pass
 
-        for root, dirs, files in os.walk(directory):
-            for file in files:
-                if file.lower() in ffmpeg_names:
-                    return os.path.join(root, file)
+    def _find_ffmpeg_in_directory(
+        self, directory: str, max_depth: int = 2
+    ) -> Optional[str]:
+        """
+        在指定目录中搜索FFmpeg可执行文件
+        按层广度优先搜索，最多深入max_depth层子目录，找到即返回，
+        避免遍历程序目录下的下载文件夹
+        """
+        current_level = [directory]
+        for depth in range(max_depth + 1):
+            next_level = []
+            for dir_path in current_level:
+                try:
+                    # scandir的目录项自带文件类型信息，无需额外stat
+                    with os.scandir(dir_path) as entries:
+                        for entry in entries:
+                            if entry.name.lower() in _FFMPEG_NAMES and entry.is_file():
+                                return entry.path
+                            if depth < max_depth and entry.is_dir(
+                                follow_symlinks=False
+                            ):
+                                next_level.append(entry.path)
+                except OSError:
+                    continue
+            current_level = next_level
 
         return None
 
@@ -344,7 +763,7 @@ class BiliFavDownloader:
                 text=True,
                 encoding="utf-8",
                 errors="ignore",
-                creationflags=subprocess.CREATE_NO_WINDOW,
+                **_SUBPROC_KWARGS,
             )
             if result.returncode == 0:
                 self._parse_ffmpeg_version(result.stdout)
@@ -354,110 +773,211 @@ class BiliFavDownloader:
         return False
 
     def _parse_ffmpeg_version(self, version_output: str):
-        """解析FFmpeg版本信息"""
-        try:
-            version_line = version_output.split("\n")[0]
-            parts = version_line.split(" ")
-            self.ffmpeg_version = parts[2] if len(parts) > 2 else "未知"
-        except Exception:
-            self.ffmpeg_version = "未知"
+        """解析FFmpeg版本信息 (只在输出开头查找版本行)"""
+        match = _FFMPEG_VER_RE.match(version_output, 0, 200)
+        self.ffmpeg_version = match.group(1) if match else "未知"
 
-    def start_merge_thread(self):
-        """启动后台合并线程"""
+    def start_merge_worker(self):
+        """启动后台合并任务 (需在事件循环中调用)"""
         if not self.ffmpeg_available:
-            print("合并线程未启动，因为FFmpeg不可用")
+            print("合并任务未启动，因为FFmpeg不可用")
             return
 
-        self.merge_running = True
-        # 创建守护线程，主线程退出时自动结束
-        self.merge_thread = threading.Thread(target=self._merge_worker, daemon=True)
-        self.merge_thread.start()
-        print("后台合并线程已启动")
-
-    def stop_merge_thread(self):
-        """停止后台合并线程"""
-        if self.merge_thread and self.merge_thread.is_alive():
-            self.merge_running = False
-            self.merge_thread.join(timeout=5.0)  # 等待线程结束
-            print("后台合并线程已停止")
-
-    def _merge_worker(self):
-        """合并工作线程的主函数"""
-        print(f"\n合并线程启动 (FFmpeg路径: {self.ffmpeg_path})")
-
-        # 持续运行直到收到停止信号且队列为空
-        while self.merge_running or self.merge_queue:
-            if interrupted:  # 检查全局中断标志
-                break
+        print(f"\n合并任务启动 (FFmpeg路径: {self.ffmpeg_path})")
+        self.merge_task = asyncio.create_task(self._merge_worker())
+        print("后台合并任务已启动")
 
-            if not self.merge_queue:
-                time.sleep(0.5)  # 队列为空时短暂休眠
-                continue
+    async def stop_merge_worker(self):
+        """停止后台合并任务，未中断时先等待队列中的合并全部完成"""
+        if self.merge_task is None:
+            return
+
+        if not interrupted:
+            await self.merge_queue.join()
+
+        # 取消调度任务及(中断时)仍在进行的合并
+        self.merge_task.cancel()
+        for job in list(self.merge_jobs):
+            job.cancel()
+        await asyncio.gather(self.merge_task, *self.merge_jobs, return_exceptions=True)
+        self.merge_task = None
+        print("后台合并任务已停止")
+
+    async def close(self):
+        """释放资源：停止合并任务，关闭HTTP客户端和数据库连接"""
+        await self.stop_merge_worker()
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+        if self.download_client is not None:
+            await self.download_client.aclose()
+            self.download_client = None
+        # 关闭连接时SQLite会将WAL日志写回主库并删除-wal/-shm文件
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def pending_merge_count(self) -> int:
+        """返回尚未完成的合并任务数 (排队中 + 进行中)"""
+        return self.merge_queue.qsize() + len(self.merge_jobs)
+
+    async def _merge_worker(self):
+        """
+        合并调度任务：从队列取出任务并发执行，并发数受信号量限制
+        队列积压时将多个任务交给同一个FFmpeg进程合并，积压任务平均分配到各并发名额
+        """
+        while True:
+            # 先获取并发名额再取任务，保证取出的任务立即开始执行
+            await self.merge_semaphore.acquire()
+            batch = [await self.merge_queue.get()]
+            extra = min(
+                MERGE_BATCH_SIZE - 1, self.merge_queue.qsize() // MAX_MERGE_WORKERS
+            )
+            for _ in range(extra):
+                batch.append(self.merge_queue.get_nowait())
+            job = asyncio.create_task(self._merge_batch(batch))
+            self.merge_jobs.add(job)
+            job.add_done_callback(self.merge_jobs.discard)
+
+    def _build_merge_cmd(
+        self, tasks: List[Tuple[str, str, str, str, str]]
+    ) -> List[str]:
+        """
+        构建FFmpeg合并命令，每个任务的音视频输入对应一个输出文件
+        参数:
+            tasks: 合并任务列表 (视频文件, 音频文件, 输出文件, 标题, BV号)
+        返回:
+            FFmpeg命令参数列表
+        """
+        ffmpeg_cmd = [
+            self.ffmpeg_path,
+            "-hide_banner",  # 不输出版本及编译信息
+            "-nostats",  # 不输出实时进度，避免无用数据写入管道
+            "-loglevel",
+            "error",  # 仅输出错误信息，失败时用于提示
+            "-y",  # 覆盖输出文件
+        ]
+        for video_file, audio_file, *_ in tasks:
+            ffmpeg_cmd += ["-i", video_file, "-i", audio_file]  # 输入视频、音频文件
+
+        for i, (_, _, output_file, *_) in enumerate(tasks):
+            ffmpeg_cmd += [
+                "-map",
+                f"{2 * i}:v:0",  # 选择该任务输入的视频流
+                "-map",
+                f"{2 * i + 1}:a:0",  # 选择该任务输入的音频流
+                "-c",
+                "copy",  # 流复制模式(不重新编码)
+                "-threads",
+                "1",  # 单线程运行，多个合并并行时互不争抢
+                output_file,  # 输出文件
+            ]
+        return ffmpeg_cmd
+
+    async def _run_ffmpeg(self, ffmpeg_cmd: List[str]) -> Tuple[int, bytes]:
+        """异步执行FFmpeg命令，不阻塞事件循环，返回 (返回码, 错误输出)"""
+        process = await asyncio.create_subprocess_exec(
+            *ffmpeg_cmd,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE,
+            **_SUBPROC_KWARGS,
+        )
+        try:
+            _, stderr = await process.communicate()
+        except asyncio.CancelledError:
+            # 合并被取消时结束FFmpeg进程
+            process.kill()
+            raise
+        return process.returncode, stderr
+
+    @staticmethod
+    def _remove_merge_temp_files(video_file: str, audio_file: str):
+        """合并成功后删除音视频临时文件及其续传信息"""
+        for temp_file in (video_file, audio_file):
+            BiliFavDownloader._remove_partial_download(temp_file)
+
+    async def _merge_batch(self, batch: List[Tuple[str, str, str, str, str]]):
+        """
+        执行一批合并任务
+        多个任务时先用一个FFmpeg进程全部合并，失败时逐个重新合并以隔离出错的任务
+        """
+        try:
+            if len(batch) == 1 or not await self._merge_many(batch):
+                for task in batch:
+                    await self._merge_one(task)
+        finally:
+            for _ in batch:
+                self.merge_queue.task_done()
+            self.merge_semaphore.release()
 
-            # 从队列中获取任务
-            with self.merge_lock:
-                task = self.merge_queue.pop(0) if self.merge_queue else None
+    async def _merge_many(
+        self, batch: List[Tuple[str, str, str, str, str]]
+    ) -> bool:
+        """
+        使用一个FFmpeg进程合并多个任务
+        返回:
+            bool: 是否全部合并成功 (中断时返回True，不再逐个重试)
+        """
+        if interrupted:
+            return True
 
-            if not task:
-                continue
+        print(f"\n开始批量合并 {len(batch)} 个视频 [使用FFmpeg]")
+        try:
+            returncode, _ = await self._run_ffmpeg(self._build_merge_cmd(batch))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"批量合并失败，逐个重新合并 - {str(e)}")
+            return False
 
-            # 解包任务参数
-            video_file, audio_file, output_file, title, bvid = task
+        if returncode != 0:
+            print(f"批量合并失败 (返回码 {returncode})，逐个重新合并")
+            return False
 
-            try:
-                print(f"\n开始合并: {title} ({bvid}) [使用FFmpeg]")
-
-                # 构建FFmpeg命令
-                ffmpeg_cmd = [
-                    self.ffmpeg_path,
-                    "-i",
-                    video_file,  # 输入视频文件
-                    "-i",
-                    audio_file,  # 输入音频文件
-                    "-c",
-                    "copy",  # 流复制模式(不重新编码)
-                    "-map",
-                    "0:v:0",  # 选择第一个输入的视频流
-                    "-map",
-                    "1:a:0",  # 选择第二个输入的音频流
-                    "-y",  # 覆盖输出文件
-                    output_file,  # 输出文件
-                ]
+        for video_file, audio_file, _, title, bvid in batch:
+            self._remove_merge_temp_files(video_file, audio_file)
+            print(f"合并完成: {title} ({bvid})")
+        print()
+        return True
 
-                # 执行FFmpeg命令
-                process = subprocess.run(
-                    ffmpeg_cmd,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    encoding="utf-8",
-                    errors="ignore",
-                    creationflags=subprocess.CREATE_NO_WINDOW,
-                )
+    async def _merge_one(self, task: Tuple[str, str, str, str, str]):
+        """执行单个音视频合并任务"""
+        # 解包任务参数
+        video_file, audio_file, output_file, title, bvid = task
 
-                # 检查命令执行结果
-                if process.returncode != 0:
-                    error_msg = process.stderr if process.stderr else "无错误信息"
-                    raise Exception(
-                        f"FFmpeg合并失败 (返回码 {process.returncode}): {error_msg}"
-                    )
+        try:
+            if interrupted:  # 检查全局中断标志
+                return
 
-                # 删除临时文件
-                if os.path.exists(video_file):
-                    os.remove(video_file)
-                if os.path.exists(audio_file):
-                    os.remove(audio_file)
+            print(f"\n开始合并: {title} ({bvid}) [使用FFmpeg]")
 
-                print(f"合并完成: {title} ({bvid})\n")
+            returncode, stderr = await self._run_ffmpeg(self._build_merge_cmd([task]))
 
-            except Exception as e:
-                print(f"合并视频失败: {title} ({bvid}) - {str(e)}")
-                # 合并失败时尝试保存视频文件
-                if os.path.exists(video_file):
-                    try:
-                        os.rename(video_file, output_file)
-                        print(f"已保存视频文件（无音频）: {title}")
-                    except Exception:
-                        pass
+            # 检查命令执行结果
+            if returncode != 0:
+                error_msg = (
+                    stderr.decode("utf-8", errors="ignore") if stderr else "无错误信息"
+                )
+                raise Exception(f"FFmpeg合并失败 (返回码 {returncode}): {error_msg}")
+
+            # 删除临时文件
+            self._remove_merge_temp_files(video_file, audio_file)
+
+            print(f"合并完成: {title} ({bvid})\n")
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"合并视频失败: {title} ({bvid}) - {str(e)}")
+            # 合并失败时尝试保存视频文件
+            if os.path.exists(video_file):
+                try:
+                    self._finish_partial_download(video_file, output_file)
+                    print(f"已保存视频文件（无音频）: {title}")
+                    # 输出文件已存在，下次运行会跳过该视频，音频临时文件不再有用
+                    self._remove_partial_download(audio_file)
+                except Exception:
+                    pass
 
     def queue_merge_task(
         self, video_file: str, audio_file: str, output_file: str, title: str, bvid: str
@@ -477,35 +997,62 @@ class BiliFavDownloader:
             print(f"无法合并: {title} ({bvid}) - FFmpeg不可用")
             return False
 
-        # 使用线程锁保证队列操作安全
-        with self.merge_lock:
-            self.merge_queue.append((video_file, audio_file, output_file, title, bvid))
+        self.merge_queue.put_nowait((video_file, audio_file, output_file, title, bvid))
 
-        print(f"\n已加入合并队列: {title} (队列长度: {len(self.merge_queue)})")
+        print(f"\n已加入合并队列: {title} (队列长度: {self.pending_merge_count()})")
         return True
 
-    def save_token(self, token_data: Dict):
-        """保存token到TOML文件"""
+    def save_token(self, token_data: Dict, quiet: bool = False):
+        """保存token到TOML文件 (quiet为True时不输出提示)"""
         try:
             with open(TOKEN_FILE, "w") as f:
                 toml.dump(token_data, f)
-            print(f"登录信息已保存\n")
+            if not quiet:
+                print(f"登录信息已保存\n")
         except Exception as e:
             print(f"保存登录信息失败: {str(e)}")
 
-    async def check_member_status(self) -> bool:
-        """检查用户大会员状态"""
+    async def check_member_status(self, allow_relogin: bool = True) -> bool:
+        """
+        检查用户大会员状态
+        结果随token一起缓存，有效期内(MEMBER_STATUS_TTL)直接使用缓存，不请求API
+        参数:
+            allow_relogin: 登录失效时是否重新登录后重试
+        """
+        uid = self.cookies.get("DedeUserID")
+
+        # 检查缓存是否属于当前用户且未过期
+        cached = self.token_data.get("member_status", {})
+        if (
+            cached.get("uid") == uid
+            and time.time() - cached.get("checked_at", 0) < MEMBER_STATUS_TTL
+        ):
+            return cached.get("is_member", False)
+
         try:
-            async with httpx.AsyncClient(
-                headers=HEADERS, cookies=self.cookies, timeout=10.0
-            ) as client:
-                # 调用API获取用户信息
-                resp = await client.get("https://api.bilibili.com/x/web-interface/nav")
-                resp.raise_for_status()
-                data = resp.json()
-                if data.get("code") == 0:
-                    # 检查vipStatus字段
-                    return data["data"].get("vipStatus", 0) == 1
+            # 调用API获取用户信息
+            resp = await self.client.get(
+                "https://api.bilibili.com/x/web-interface/nav", timeout=10.0
+            )
+            resp.raise_for_status()
+            data = parse_json(resp.content)
+            if data.get("code") == NOT_LOGGED_IN_CODE:
+                # 保存的登录信息已失效，重新登录后再检查
+                if allow_relogin and await self._relogin():
+                    return await self.check_member_status(allow_relogin=False)
+                return False
+            if data.get("code") == 0:
+                # 检查vipStatus字段
+                is_member = data["data"].get("vipStatus", 0) == 1
+
+                # 缓存查询结果
+                self.token_data["member_status"] = {
+                    "uid": uid,
+                    "is_member": is_member,
+                    "checked_at": int(time.time()),
+                }
+                self.save_token(self.token_data, quiet=True)
+                return is_member
         except Exception as e:
             print(f"检查会员状态失败: {str(e)}")
         return False
@@ -518,7 +1065,7 @@ class BiliFavDownloader:
         """检查并加载token文件"""
         if Path(TOKEN_FILE).exists():
             try:
-                return toml.load(TOKEN_FILE)
+                return load_toml_file(TOKEN_FILE)
             except Exception as e:
                 print(f"读取登录信息失败: {str(e)}")
                 # 删除无效的token文件
@@ -547,126 +1094,121 @@ class BiliFavDownloader:
             self.qr_file = None
 
         try:
-            async with httpx.AsyncClient(headers=HEADERS, timeout=30.0) as client:
-                # 1. 获取二维码信息
-                qr_resp = await client.get(
-                    "https://passport.bilibili.com/x/passport-login/web/qrcode/generate"
-                )
-                qr_resp.raise_for_status()
-                qr_data = qr_resp.json()
+            client = self.client
 
-                if qr_data.get("code") != 0:
-                    print(f"获取二维码失败: {qr_data.get('message')}")
-                    return None
-
-                qr_url = qr_data["data"]["url"]
-                qrcode_key = qr_data["data"]["qrcode_key"]
-
-                # 2. 创建二维码
-                qr = qrcode.QRCode(
-                    version=1,
-                    error_correction=qrcode.constants.ERROR_CORRECT_L,
-                    box_size=15,  # 增大box_size以提高分辨率
-                    border=2,
-                )
-                qr.add_data(qr_url)
-                qr.make(fit=True)
-
-                # 3. 在终端打印二维码
-                print("\n终端二维码预览:")
-                qr.print_ascii(invert=True)  # 使用ASCII字符打印二维码
+            # 1. 获取二维码信息
+            qr_resp = await client.get(
+                "https://passport.bilibili.com/x/passport-login/web/qrcode/generate"
+            )
+            qr_resp.raise_for_status()
+            qr_data = parse_json(qr_resp.content)
 
-                # 4. 保存二维码图片(如果需要)
-                if self.qr_file:
-                    img = qr.make_image(fill_color="black", back_color="white")
-                    img = img.resize((600, 600))  # 调整图像大小
-                    img.save(self.qr_file)
-                    print(f"\n二维码已保存为: {self.qr_file}")
+            if qr_data.get("code") != 0:
+                print(f"获取二维码失败: {qr_data.get('message')}")
+                return None
 
-                print("\n请使用哔哩哔哩APP扫码登录（二维码有效期为180秒）")
-                print("按Ctrl+C可取消登录")
+            qr_url = qr_data["data"]["url"]
+            qrcode_key = qr_data["data"]["qrcode_key"]
 
-                # 5. 轮询登录状态
-                for i in range(180):  # 180秒超时
-                    if interrupted:
-                        print("\n登录过程被中断")
-                        return None
+            # 2. 创建二维码 (仅保存图片时才需要较大的box_size)
+            qr = qrcode.QRCode(
+                version=1,
+                error_correction=qrcode.constants.ERROR_CORRECT_L,
+                box_size=10 if self.qr_file else 1,
+                border=2,
+            )
+            qr.add_data(qr_url)
+            qr.make(fit=True)
+
+            # 3. 在终端打印二维码
+            print("\n终端二维码预览:")
+            qr.print_ascii(invert=True)  # 使用ASCII字符打印二维码
+
+            # 4. 保存二维码图片(如果需要)，直接按box_size渲染，无需再缩放
+            if self.qr_file:
+                img = qr.make_image(fill_color="black", back_color="white")
+                img.save(self.qr_file)
+                print(f"\n二维码已保存为: {self.qr_file}")
+
+            print("\n请使用哔哩哔哩APP扫码登录（二维码有效期为180秒）")
+            print("按Ctrl+C可取消登录")
+
+            # 5. 轮询登录状态
+            # 未扫码时逐步拉长轮询间隔(最长5秒)，已扫码等待确认时恢复为1秒
+            start_time = time.monotonic()
+            unscanned_polls = 0
+            while (elapsed := time.monotonic() - start_time) < QR_LOGIN_TIMEOUT:
+                if interrupted:
+                    print("\n登录过程被中断")
+                    return None
 
-                    print(f"\r等待扫码确认... [{i}/180秒]", end="", flush=True)
+                print(
+                    f"\r等待扫码确认... [{int(elapsed)}/{QR_LOGIN_TIMEOUT}秒]",
+                    end="",
+                    flush=True,
+                )
+                delay = min(QR_POLL_MAX_INTERVAL, 1.2**unscanned_polls)
 
-                    try:
-                        # 检查登录状态
-                        check_resp = await client.get(
-                            "https://passport.bilibili.com/x/passport-login/web/qrcode/poll",
-                            params={"qrcode_key": qrcode_key},
-                            timeout=5.0,
-                        )
-                        check_resp.raise_for_status()
-                        check_data = check_resp.json()
-                    except httpx.TimeoutException:
-                        # 超时继续尝试
-                        await asyncio.sleep(1)
-                        continue
-                    except Exception as e:
-                        print(f"\n检查登录状态失败: {str(e)}")
-                        await asyncio.sleep(1)
-                        continue
+                try:
+                    # 检查登录状态
+                    check_resp = await client.get(
+                        "https://passport.bilibili.com/x/passport-login/web/qrcode/poll",
+                        params={"qrcode_key": qrcode_key},
+                        timeout=3.0,
+                    )
+                    check_resp.raise_for_status()
+                    check_data = parse_json(check_resp.content)
+                except httpx.TimeoutException:
+                    # 超时继续尝试
+                    await asyncio.sleep(delay)
+                    continue
+                except Exception as e:
+                    print(f"\n检查登录状态失败: {str(e)}")
+                    await asyncio.sleep(delay)
+                    continue
 
-                    # 处理不同状态码
-                    if check_data.get("data", {}).get("code") == 86038:  # 二维码过期
-                        print("\n二维码已过期，请重新运行程序获取新二维码")
+                # 处理不同状态码
+                status_code = check_data.get("data", {}).get("code")
+                if status_code == 86038:  # 二维码过期
+                    print("\n二维码已过期，请重新运行程序获取新二维码")
+                    return None
+                elif status_code == 86039:  # 未扫描
+                    unscanned_polls += 1
+                elif status_code == 86090:  # 已扫描，等待确认
+                    unscanned_polls = 0
+                    delay = 1.0
+                elif status_code == 0:  # 登录成功
+                    # 直接使用httpx已解析的响应cookies
+                    cookies = {
+                        name: check_resp.cookies.get(name)
+                        for name in LOGIN_COOKIE_NAMES
+                        if check_resp.cookies.get(name)
+                    }
+                    if not cookies:
+                        print("\n获取登录Cookie失败")
                         return None
-                    elif check_data.get("data", {}).get("code") == 86039:  # 未扫描
-                        await asyncio.sleep(1)
-                        continue
-                    elif check_data.get("data", {}).get("code") == 0:  # 登录成功
-                        # 从响应头解析cookies
-                        cookies = self.parse_cookies(
-                            str(check_resp.headers.get("set-cookie", ""))
-                        )
-                        if not cookies:
-                            print("\n获取登录Cookie失败")
-                            return None
 
-                        # 构建token信息
-                        token_info = {"cookies": cookies, "timestamp": int(time.time())}
-                        print("\n登录成功！")
-                        return token_info
+                    # 构建token信息
+                    token_info = {"cookies": cookies, "timestamp": int(time.time())}
+                    print("\n登录成功！")
+                    return token_info
 
-                    # 等待1秒后继续
-                    await asyncio.sleep(1)
+                await asyncio.sleep(delay)
 
-                print("\n登录超时，请重试")
-                return None
+            print("\n登录超时，请重试")
+            return None
         except Exception as e:
             print(f"\n登录出错: {str(e)}")
             return None
 
-    def parse_cookies(self, cookie_header: str) -> Dict:
+    async def get_favorites(
+        self, session: httpx.AsyncClient, allow_relogin: bool = True
+    ) -> List[Dict]:
         """
-        从HTTP响应头解析cookies
+        获取用户创建的收藏夹列表
         参数:
-            cookie_header: Set-Cookie头内容
-        返回:
-            Dict: 解析出的cookies字典
-        """
-        cookies = {}
-        if not cookie_header:
-            return cookies
-
-        # 解析关键cookies
-        for item in cookie_header.split(","):
-            item = item.strip()
-            if "SESSDATA=" in item:
-                cookies["SESSDATA"] = item.split("SESSDATA=")[1].split(";")[0]
-            elif "bili_jct=" in item:
-                cookies["bili_jct"] = item.split("bili_jct=")[1].split(";")[0]
-            elif "DedeUserID=" in item:
-                cookies["DedeUserID"] = item.split("DedeUserID=")[1].split(";")[0]
-        return cookies
-
-    async def get_favorites(self, session: httpx.AsyncClient) -> List[Dict]:
-        """获取用户创建的收藏夹列表"""
+            allow_relogin: 登录失效时是否重新登录后重试
+        """
         try:
             print("正在获取收藏夹列表...")
             resp = await session.get(
@@ -675,7 +1217,12 @@ class BiliFavDownloader:
                 timeout=30.0,
             )
             resp.raise_for_status()
-            data = resp.json()
+            data = parse_json(resp.content)
+            if data.get("code") == NOT_LOGGED_IN_CODE:
+                # 登录已失效，重新登录后重试
+                if allow_relogin and await self._relogin():
+                    return await self.get_favorites(session, allow_relogin=False)
+                return []
             if data.get("code") != 0:
                 print(f"获取收藏夹列表失败: {data.get('message')}")
                 return []
@@ -684,29 +1231,29 @@ class BiliFavDownloader:
             print(f"获取收藏夹列表失败: {str(e)}")
             return []
 
-    async def get_favorite_detail(
-        self, session: httpx.AsyncClient, media_id: int, media_count: int
-    ) -> List[Dict]:
-        """获取指定收藏夹的详细内容"""
-        global interrupted
-        all_items = []
-        page = 1
-        page_size = 20  # 每页项目数
-
-        try:
-            print(f"开始获取收藏夹内容，共约{media_count}项...")
-
-            # 创建进度条
-            pbar = tqdm(total=media_count, desc=f"收藏夹ID {media_id}", unit="项")
-            count = 0
-
-            while not interrupted:
-                # 随机延迟防止请求过快
-                delay = random.uniform(0.1, 0.8)
-                await asyncio.sleep(delay)
+    async def _fetch_favorite_page(
+        self,
+        session: httpx.AsyncClient,
+        media_id: int,
+        page: int,
+        page_size: int,
+        semaphore: asyncio.Semaphore,
+        allow_relogin: bool = True,
+    ) -> Optional[Dict]:
+        """
+        获取收藏夹的一页内容
+        参数:
+            allow_relogin: 登录失效时是否重新登录后重试
+        返回:
+            Dict: 该页的data字段，失败或中断时返回None
+        """
+        async with semaphore:
+            if interrupted:
+                return None
 
-                try:
-                    # 获取当前页内容
+            try:
+                # 通过限速器控制请求频率，未超出速率时无需等待
+                async with self.api_limiter:
                     resp = await session.get(
                         "https://api.bilibili.com/x/v3/fav/resource/list",
                         params={
@@ -717,53 +1264,113 @@ class BiliFavDownloader:
                         },
                         timeout=30.0,
                     )
-                    resp.raise_for_status()
-                    data = resp.json()
+                resp.raise_for_status()
+                data = parse_json(resp.content)
+            except Exception as e:
+                print(f"获取收藏夹详情失败: {str(e)}")
+                return None
 
-                    if data.get("code") != 0:
-                        if page == 1:
-                            print(f"获取收藏夹详情失败: {data.get('message')}")
-                        page += 1
-                        if page > 50:  # 防止无限循环
-                            break
-                        continue
+            if data.get("code") == 0:
+                return data["data"]
+            if data.get("code") != NOT_LOGGED_IN_CODE or not allow_relogin:
+                if page == 1:
+                    print(f"获取收藏夹详情失败: {data.get('message')}")
+                return None
 
-                    # 添加当前页项目
-                    items = data["data"].get("medias", [])
-                    all_items.extend(items)
-                    count = len(all_items)
+        # 登录已失效：释放并发名额后重新登录(并发请求共用同一次登录)，再重试一次
+        if not await self._relogin():
+            return None
+        return await self._fetch_favorite_page(
+            session, media_id, page, page_size, semaphore, allow_relogin=False
+        )
+
+    async def get_favorite_detail(
+        self, session: httpx.AsyncClient, media_id: int, media_count: int
+    ) -> List[Dict]:
+        """
+        获取指定收藏夹的详细内容
+        先获取第一页，再根据收藏数量并发获取其余页面(最多同时4个请求)
+        """
+        global interrupted
+        page_size = 20  # 每页项目数
+        max_pages = 50  # 安全限制，防止无限翻页
+        semaphore = asyncio.Semaphore(4)  # 限制并发请求数
+        pages_data = []  # 按页码顺序保存每页数据
 
+        try:
+            print(f"开始获取收藏夹内容，共约{media_count}项...")
+
+            # 创建进度条
+            pbar = tqdm(total=media_count, desc=f"收藏夹ID {media_id}", unit="项")
+
+            async def fetch_page(page: int) -> Optional[Dict]:
+                page_data = await self._fetch_favorite_page(
+                    session, media_id, page, page_size, semaphore
+                )
+                if page_data:
                     # 更新进度条
-                    pbar.update(len(items))
+                    pbar.update(len(page_data.get("medias") or []))
+                return page_data
 
-                    # 检查是否还有更多页
-                    has_more = data["data"].get("has_more", 0) == 1
-                    if not has_more or len(items) < page_size:
-                        break
+            try:
+                # 先获取第一页
+                first_page = await fetch_page(1)
+                pages_data.append(first_page)
+
+                # 第一页明确没有更多内容时无需继续
+                if not (first_page and first_page.get("has_more", 0) != 1):
+                    # 根据收藏数量计算总页数，并发获取其余页面
+                    total_pages = min(math.ceil(media_count / page_size), max_pages)
+                    pages_data.extend(
+                        await asyncio.gather(
+                            *(fetch_page(p) for p in range(2, total_pages + 1))
+                        )
+                    )
 
-                    page += 1
-                    if page > 50:  # 安全限制
-                        break
-                except Exception as e:
-                    print(f"获取收藏夹详情失败: {str(e)}")
-                    page += 1
-                    if page > 50:
-                        break
+                    # 收藏数量可能已过时，最后一页仍有更多内容时继续顺序获取
+                    page = max(total_pages, 1)
+                    while (
+                        pages_data[-1]
+                        and pages_data[-1].get("has_more", 0) == 1
+                        and page < max_pages
+                        and not interrupted
+                    ):
+                        page += 1
+                        pages_data.append(await fetch_page(page))
+            finally:
+                pbar.close()
 
-            pbar.close()
-            print(f"获取完成: {count}/{media_count} 项")
+            # 按页码顺序合并项目
+            all_items = []
+            for page_data in pages_data:
+                if page_data:
+                    all_items.extend(page_data.get("medias") or [])
+
+            print(f"获取完成: {len(all_items)}/{media_count} 项")
             return all_items
         except Exception as e:
             print(f"\n获取收藏夹详情失败: {str(e)}")
-            return all_items
+            return [
+                item
+                for page_data in pages_data
+                if page_data
+                for item in (page_data.get("medias") or [])
+            ]
 
     def upgrade_database(self):
-        """升级数据库结构或创建新数据库"""
+        """
+        升级数据库结构或创建新数据库
+        每次运行只需成功检查一次，之后的调用直接返回
+        """
+        if self._schema_ready:
+            return
+
         if not self.db_exists:
             # 首次运行时创建数据库
             print(f"\n首次运行，创建数据库...")
+            conn = None
             try:
-                conn = sqlite3.connect(DB_FILE)
+                conn = self._get_db()
                 c = conn.cursor()
 
                 # 创建收藏夹表
@@ -785,24 +1392,33 @@ class BiliFavDownloader:
                     title TEXT,
                     bvid TEXT,
                     owner_name TEXT,
+                    page_count INTEGER,
+                    cid INTEGER,
+                    duration INTEGER,
                     FOREIGN KEY(favorite_id) REFERENCES favorites(id)
                 )
                 """)
 
+                # 创建查询索引
+                self._ensure_indexes(c)
+
                 conn.commit()
                 print("数据库创建成功")
+                self._schema_ready = True
                 self.db_exists = True
                 self.first_run = True  # 标记为首次运行
             except Exception as e:
                 print(f"创建数据库失败: {str(e)}")
             finally:
-                if conn:
-                    conn.close()
+                # 出错时撤销未提交的修改
+                if conn is not None and conn.in_transaction:
+                    conn.rollback()
             return
 
         # 已有数据库时的升级逻辑
+        conn = None
         try:
-            conn = sqlite3.connect(DB_FILE)
+            conn = self._get_db()
             c = conn.cursor()
 
             # 检查是否有last_updated列
@@ -817,99 +1433,139 @@ class BiliFavDownloader:
                 c.execute("UPDATE favorites SET last_updated=?", (current_time,))
                 print("数据库升级完成")
 
+            # 检查收藏项表是否有分P信息列 (旧数据为空，下次更新收藏夹时补全)
+            c.execute("PRAGMA table_info(favorite_items)")
+            item_columns = {col[1] for col in c.fetchall()}
+            for column in ("page_count", "cid", "duration"):
+                if column not in item_columns:
+                    c.execute(f"ALTER TABLE favorite_items ADD COLUMN {column} INTEGER")
+
+            # 旧版数据库补建查询索引
+            self._ensure_indexes(c)
+
             conn.commit()
+            self._schema_ready = True
         except Exception as e:
             print(f"数据库升级失败: {str(e)}")
         finally:
-            if conn:
-                conn.close()
+            # 出错时撤销未提交的修改
+            if conn is not None and conn.in_transaction:
+                conn.rollback()
+
+    def _ensure_indexes(self, c: sqlite3.Cursor):
+        """创建缺少的查询索引，有新建索引时更新统计信息以便查询优化器使用索引"""
+        c.execute("SELECT name FROM sqlite_master WHERE type='index'")
+        existing = {row[0] for row in c.fetchall()}
+
+        created = False
+        for name, sql in DB_INDEXES:
+            if name not in existing:
+                c.execute(sql)
+                created = True
+
+        if created:
+            c.execute("ANALYZE")
 
     async def save_to_db(self, data: List[Dict]) -> bool:
-        """保存收藏夹数据到数据库"""
-        # 确保数据库存在且结构正确
-        self.upgrade_database()
+        """保存收藏夹数据到数据库 (在后台线程中执行，不阻塞事件循环)"""
+        return await asyncio.to_thread(self._save_to_db_sync, data)
 
-        conn = None
-        try:
-            conn = sqlite3.connect(DB_FILE)
-            c = conn.cursor()
+    def _save_to_db_sync(self, data: List[Dict]) -> bool:
+        """保存收藏夹数据到数据库的同步实现，写操作由数据库锁保护"""
+        with self._db_lock:
+            # 确保数据库存在且结构正确
+            self.upgrade_database()
 
-            # 在保存所有数据前获取当前时间
-            current_time = datetime.now().isoformat()
-            self.current_update_time = current_time
+            conn = None
+            try:
+                conn = self._get_db()
+                c = conn.cursor()
 
-            total_items = 0
+                # 在保存所有数据前获取当前时间
+                current_time = datetime.now().isoformat()
+                self.current_update_time = current_time
 
-            # 遍历所有收藏夹
-            for folder in data:
-                # 检查收藏夹是否存在
-                c.execute("SELECT 1 FROM favorites WHERE id=?", (folder["id"],))
-                exists = c.fetchone()
+                # 整个保存过程在一个事务中完成，只在提交时写盘一次
+                c.execute("BEGIN IMMEDIATE")
 
-                if exists:
-                    # 更新收藏夹信息
-                    c.execute(
-                        "UPDATE favorites SET title=?, count=?, last_updated=? WHERE id=?",
-                        (
-                            folder["title"],
-                            folder["media_count"],
-                            current_time,
-                            folder["id"],
-                        ),
-                    )
-                else:
-                    # 插入新收藏夹
-                    c.execute(
-                        "INSERT INTO favorites (id, title, media_id, count, last_updated) VALUES (?, ?, ?, ?, ?)",
+                # 插入或更新收藏夹信息 (已存在时只更新标题、数量和更新时间)
+                c.executemany(
+                    SQL_UPSERT_FAVORITE,
+                    [
                         (
                             folder["id"],
                             folder["title"],
                             folder["id"],
                             folder["media_count"],
                             current_time,
-                        ),
-                    )
-
-                # 删除旧条目
-                c.execute(
-                    "DELETE FROM favorite_items WHERE favorite_id=?", (folder["id"],)
+                        )
+                        for folder in data
+                    ],
                 )
 
-                # 插入收藏项
-                for item in folder.get("items", []):
-                    total_items += 1
-                    owner = (
-                        item.get("upper", {}).get("name", "未知作者")
-                        if "upper" in item
-                        else "未知作者"
-                    )
-                    bvid = item.get("bvid", "")
-
-                    # 使用组合ID (收藏夹ID_BVID)
-                    item_id = f"{folder['id']}_{bvid}"
+                # 遍历所有收藏夹
+                item_rows = {}  # 待插入的收藏项 (组合ID -> 行数据)，重复项只保留第一个
+                add_row = item_rows.setdefault
+                for folder in data:
+                    folder_id = folder["id"]
+                    # 收集收藏项 (每个字段只查询一次)
+                    for item in folder.get("items", ()):
+                        upper = item.get("upper")
+                        owner = upper.get("name", "未知作者") if upper else "未知作者"
+                        bvid = item.get("bvid", "")
+
+                        # 使用组合ID (收藏夹ID_BVID)
+                        item_id = f"{folder_id}_{bvid}"
+                        # 同时保存分P数量、首个分P的CID和时长，单分P视频下载时无需再查询
+                        add_row(
+                            item_id,
+                            (
+                                item_id,
+                                folder_id,
+                                item["title"],
+                                bvid,
+                                owner,
+                                item.get("page"),
+                                (item.get("ugc") or {}).get("first_cid"),
+                                item.get("duration"),
+                            ),
+                        )
 
-                    # 插入或忽略重复项
+                # 删除旧条目 (按批次用一条IN语句删除多个收藏夹的条目)
+                folder_ids = [folder["id"] for folder in data]
+                for start in range(0, len(folder_ids), SQL_MAX_IN_PARAMS):
+                    batch = folder_ids[start : start + SQL_MAX_IN_PARAMS]
                     c.execute(
-                        "INSERT OR IGNORE INTO favorite_items (id, favorite_id, title, bvid, owner_name) VALUES (?, ?, ?, ?, ?)",
-                        (item_id, folder["id"], item["title"], bvid, owner),
+                        SQL_DELETE_FAVORITE_ITEMS.format(
+                            placeholders=",".join("?" * len(batch))
+                        ),
+                        batch,
                     )
 
-            conn.commit()
-            print(f"成功保存 {len(data)} 个收藏夹，共{total_items}个项目到数据库")
+                # 批量插入收藏项 (旧条目已删除且已在内存中去重，无需OR IGNORE)
+                c.executemany(SQL_INSERT_FAVORITE_ITEM, item_rows.values())
+                total_items = len(item_rows)
 
-            # 更新最后更新时间
-            self.last_updated = datetime.fromisoformat(current_time)
+                conn.commit()
+                print(f"成功保存 {len(data)} 个收藏夹，共{total_items}个项目到数据库")
 
-            return True
-        except sqlite3.IntegrityError as e:
-            print(f"数据库保存失败 (唯一约束): {str(e)}")
-            return False
-        except Exception as e:
-            print(f"保存到数据库失败: {str(e)}")
-            return False
-        finally:
-            if conn:
-                conn.close()
+                # 数据已变化，清空收藏夹视频列表缓存
+                self._favorite_videos_cache.clear()
+
+                # 更新最后更新时间
+                self.last_updated = datetime.fromisoformat(current_time)
+
+                return True
+            except sqlite3.IntegrityError as e:
+                print(f"数据库保存失败 (唯一约束): {str(e)}")
+                return False
+            except Exception as e:
+                print(f"保存到数据库失败: {str(e)}")
+                return False
+            finally:
+                # 出错时撤销未提交的修改
+                if conn is not None and conn.in_transaction:
+                    conn.rollback()
 
     def print_tree(self, data: List[Dict]):
         """打印收藏夹树形结构"""
@@ -938,30 +1594,38 @@ class BiliFavDownloader:
 
     def get_favorite_videos(
         self, favorite_id: int
-    ) -> Tuple[str, List[Tuple[str, str]]]:
-        """从数据库获取指定收藏夹的视频列表"""
+    ) -> Tuple[str, List[Tuple]]:
+        """
+        从数据库获取指定收藏夹的视频列表
+        查询结果按收藏夹ID缓存，保存新数据到数据库时清空缓存
+        返回:
+            Tuple: (收藏夹标题, [(标题, BV号, 分P数量, 首个分P的CID, 时长), ...])
+        """
+        cached = self._favorite_videos_cache.get(favorite_id)
+        if cached is not None:
+            return cached
+
         try:
-            conn = sqlite3.connect(DB_FILE)
-            c = conn.cursor()
+            # 共享连接可能正被后台线程写入，读取同样需要持锁
+            with self._db_lock:
+                c = self._get_db().cursor()
 
-            # 获取收藏夹标题
-            c.execute("SELECT title FROM favorites WHERE id=?", (favorite_id,))
-            row = c.fetchone()
-            folder_title = row[0] if row else f"收藏夹_{favorite_id}"
+                # 获取收藏夹标题
+                c.execute("SELECT title FROM favorites WHERE id=?", (favorite_id,))
+                row = c.fetchone()
+                folder_title = row[0] if row else f"收藏夹_{favorite_id}"
 
-            # 获取收藏夹中的视频
-            c.execute(
-                "SELECT title, bvid FROM favorite_items WHERE favorite_id=?",
-                (favorite_id,),
-            )
-            videos = c.fetchall()
+                # 获取收藏夹中的视频
+                c.execute(
+                    "SELECT title, bvid, page_count, cid, duration FROM favorite_items WHERE favorite_id=?",
+                    (favorite_id,),
+                )
+                videos = c.fetchall()
+            self._favorite_videos_cache[favorite_id] = (folder_title, videos)
             return folder_title, videos
         except Exception as e:
             print(f"从数据库获取收藏夹视频失败: {str(e)}")
             return f"收藏夹_{favorite_id}", []
-        finally:
-            if conn:
-                conn.close()
 
     async def get_video_info(
         self, session: httpx.AsyncClient, bvid: str
@@ -974,7 +1638,7 @@ class BiliFavDownloader:
                 timeout=15.0,
             )
             resp.raise_for_status()
-            data = resp.json()
+            data = parse_json(resp.content)
             if data.get("code") != 0:
                 print(f"获取视频信息失败: {data.get('message')}")
                 return None
@@ -983,6 +1647,30 @@ class BiliFavDownloader:
             print(f"获取视频信息失败: {str(e)}")
             return None
 
+    @staticmethod
+    def _pages_from_video_info(video_info: Dict) -> List[Dict]:
+        """
+        从视频详细信息中提取分P列表
+        视频详情接口已包含分P信息，已获取详情时无需再次请求
+        参数:
+            video_info: get_video_info返回的视频数据
+        返回:
+            分P信息列表 (单分P视频返回只包含主分P的列表)
+        """
+        # 检查是否有多个分P
+        pages = video_info.get("pages", [])
+        if len(pages) > 1:
+            return pages
+        # 单分P视频，返回包含主分P的列表
+        return [
+            {
+                "cid": video_info["cid"],
+                "page": 1,
+                "part": video_info.get("title", "主视频"),
+                "duration": video_info.get("duration", 0),
+            }
+        ]
+
     async def get_video_pages(
         self, session: httpx.AsyncClient, bvid: str
     ) -> Optional[List[Dict]]:
@@ -991,21 +1679,7 @@ class BiliFavDownloader:
             video_info = await self.get_video_info(session, bvid)
             if not video_info:
                 return None
-
-            # 检查是否有多个分P
-            pages = video_info.get("pages", [])
-            if len(pages) > 1:
-                return pages
-            else:
-                # 单分P视频，返回包含主分P的列表
-                return [
-                    {
-                        "cid": video_info["cid"],
-                        "page": 1,
-                        "part": video_info.get("title", "主视频"),
-                        "duration": video_info.get("duration", 0),
-                    }
-                ]
+            return self._pages_from_video_info(video_info)
         except Exception as e:
             print(f"获取视频分P信息失败: {str(e)}")
             return None
@@ -1037,49 +1711,33 @@ class BiliFavDownloader:
         # 替换中文破折号为英文连字符
         input_str = input_str.replace("—", "-")
 
-        selected_pages = set()
-
-        try:
-            # 解析逗号分隔的多个选择
-            parts = input_str.split(",")
-            for part in parts:
-                part = part.strip()
-                if not part:
-                    continue
-
-                # 检查是否是范围选择 (如: 1-5)
-                if "-" in part:
-                    range_parts = part.split("-")
-                    if len(range_parts) == 2:
-                        start = int(range_parts[0].strip())
-                        end = int(range_parts[1].strip())
-                        if (
-                            1 <= start <= total_pages
-                            and 1 <= end <= total_pages
-                            and start <= end
-                        ):
-                            selected_pages.update(range(start, end + 1))
-                        else:
-                            print(f"无效范围: {part}")
-                            return None
-                    else:
-                        print(f"无效范围格式: {part}")
-                        return None
-                else:
-                    # 单个数字
-                    page_num = int(part)
-                    if 1 <= page_num <= total_pages:
-                        selected_pages.add(page_num)
-                    else:
-                        print(f"无效分P号: {page_num}")
-                        return None
-
-            return sorted(list(selected_pages))
-
-        except ValueError:
+        # 只去除分隔符两侧的空白后整体校验格式 (如: 1,3,5-7)，
+        # 数字之间的空白 (如: "1 2") 视为格式错误而不是拼接成12
+        input_str = _PAGE_SEP_SPACE_RE.sub(r"\1", input_str)
+        if not _PAGE_SELECTION_RE.fullmatch(input_str):
             print("输入格式错误，请使用数字、逗号或连字符")
             return None
 
+        # 用字节数组标记选中的分P，结果天然有序且去重
+        selected = bytearray(total_pages + 1)
+        for match in _PAGE_RANGE_RE.finditer(input_str):
+            start = int(match.group(1))
+            if match.group(2) is None:
+                # 单个数字
+                if not 1 <= start <= total_pages:
+                    print(f"无效分P号: {start}")
+                    return None
+                selected[start] = 1
+            else:
+                # 范围选择 (如: 1-5)
+                end = int(match.group(2))
+                if not 1 <= start <= end <= total_pages:
+                    print(f"无效范围: {match.group(0)}")
+                    return None
+                selected[start : end + 1] = b"\x01" * (end - start + 1)
+
+        return [page for page, flag in enumerate(selected) if flag]
+
     async def get_video_url(
         self, session: httpx.AsyncClient, bvid: str, cid: int, quality: int = 80
     ) -> Optional[Dict]:
@@ -1097,7 +1755,7 @@ class BiliFavDownloader:
             quality = NON_MEMBER_MAX_QUALITY
 
         # 对于360P和最低清晰度，不使用DASH格式
-        use_dash = quality not in [16, 6]  # 16=360P, 6=最低
+        use_dash = quality not in _FLV_QUALITIES
 
         # 显示使用的格式
         format_type = "DASH" if use_dash else "FLV"
@@ -1123,7 +1781,7 @@ class BiliFavDownloader:
                 "https://api.bilibili.com/x/player/playurl", params=params, timeout=15.0
             )
             resp.raise_for_status()
-            data = resp.json()
+            data = parse_json(resp.content)
 
             if data.get("code") != 0:
                 # 回退到非DASH格式
@@ -1134,7 +1792,7 @@ class BiliFavDownloader:
                     timeout=15.0,
                 )
                 resp.raise_for_status()
-                data = resp.json()
+                data = parse_json(resp.content)
                 if data.get("code") != 0:
                     return None
 
@@ -1149,26 +1807,22 @@ class BiliFavDownloader:
             dash_data = data["data"].get("dash")
             if dash_data and use_dash:
                 # 获取视频流
-                video_streams = dash_data.get("video", [])
-                selected_video = None
-                for stream in video_streams:
-                    if stream.get("id") == quality:
-                        selected_video = stream
-                        break
-                # 如果没有匹配的quality，选择最高质量的视频流
-                if not selected_video and video_streams:
-                    video_streams.sort(key=lambda x: x.get("id", 0), reverse=True)
-                    selected_video = video_streams[0]
-
-                # 获取音频流
-                audio_streams = dash_data.get("audio", [])
-                selected_audio = None
-                if audio_streams:
-                    # 选择最高质量的音频流
-                    audio_streams.sort(
-                        key=lambda x: x.get("bandwidth", 0), reverse=True
+                video_streams = dash_data.get("video") or []
+                selected_video = next(
+                    (s for s in video_streams if s.get("id") == quality), None
+                )
+                # 如果没有匹配的quality，选择最高质量的视频流 (只需取最大值，无需排序)
+                if not selected_video:
+                    selected_video = max(
+                        video_streams, key=lambda x: x.get("id", 0), default=None
                     )
-                    selected_audio = audio_streams[0]
+
+                # 获取音频流，选择最高质量的音频流
+                selected_audio = max(
+                    dash_data.get("audio") or [],
+                    key=lambda x: x.get("bandwidth", 0),
+                    default=None,
+                )
 
                 if selected_video and selected_audio:
                     return {
@@ -1187,6 +1841,76 @@ class BiliFavDownloader:
             print(f"获取视频URL失败: {str(e)}")
             return None
 
+    @staticmethod
+    def _remove_partial_download(file_path: str):
+        """删除下载临时文件及其续传信息文件"""
+        for temp_file in (file_path, file_path + RESUME_INFO_SUFFIX):
+            try:
+                os.remove(temp_file)
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def _save_resume_info(
+        file_path: str, key: str, total: int, etag: Optional[str]
+    ):
+        """
+        记录下载临时文件的续传校验信息
+        参数:
+            key: 流标识 (URL路径，包含cid与流编号)
+            total: 文件总大小，无法确定(<=0)时不记录，临时文件不可续传
+            etag: 服务器返回的ETag (可选)
+        """
+        info_file = file_path + RESUME_INFO_SUFFIX
+        try:
+            if total <= 0:
+                os.remove(info_file)
+                return
+            info = {"key": key, "total": total}
+            if etag:
+                info["etag"] = etag
+            with open(info_file, "w", encoding="utf-8") as f:
+                toml.dump(info, f)
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def _check_resume(file_path: str, key: str) -> Tuple[int, Optional[Dict]]:
+        """
+        校验上次中断留下的下载临时文件能否续传
+        续传信息缺失、属于其他流或已超出总大小的临时文件无法校验，直接删除
+        参数:
+            file_path: 下载临时文件路径
+            key: 本次下载的流标识
+        返回:
+            Tuple: (续传起始位置, 续传信息)，不可续传时为 (0, None)
+        """
+        try:
+            size = os.stat(file_path).st_size
+        except FileNotFoundError:
+            size = 0
+        if size > 0:
+            try:
+                info = load_toml_file(file_path + RESUME_INFO_SUFFIX)
+            except Exception:
+                info = None
+            if (
+                info is not None
+                and info.get("key") == key
+                and isinstance(info.get("total"), int)
+                and size <= info["total"]
+            ):
+                return size, info
+            print(f"无法校验已有的临时文件，重新下载: {os.path.basename(file_path)}")
+        BiliFavDownloader._remove_partial_download(file_path)
+        return 0, None
+
+    @staticmethod
+    def _finish_partial_download(file_path: str, output_file: str):
+        """将下载完成的临时文件重命名为输出文件，并删除其续传信息"""
+        os.rename(file_path, output_file)
+        BiliFavDownloader._remove_partial_download(file_path)
+
     async def download_file(
         self, url: str, file_path: str, title: str, file_type: str, headers: Dict
     ) -> bool:
@@ -1208,70 +1932,157 @@ class BiliFavDownloader:
             else:
                 print(f"\n开始下载{file_type}: {title}")
 
-            async with httpx.AsyncClient(headers=headers, timeout=60.0) as client:
-                # 流式下载
-                async with client.stream("GET", url, follow_redirects=True) as response:
-                    response.raise_for_status()
-                    total_size = int(response.headers.get("Content-Length", 0))
-
-                    # 处理无效的文件大小
-                    if total_size <= 0:
-                        # 尝试从Content-Range头获取文件大小
-                        if "Content-Range" in response.headers:
-                            try:
-                                total_size = int(
-                                    response.headers["Content-Range"].split("/")[-1]
-                                )
-                            except:
-                                # 如果无法确定文件大小，使用默认值
-                                total_size = 1024 * 1024  # 1MB
-                        else:
-                            total_size = 1024 * 1024  # 1MB
-
-                    # 创建进度条
-                    pbar = tqdm(
-                        total=total_size,
-                        desc=f"{file_type}下载: {title[:30]}",  # 限制标题长度
-                        unit="B",
-                        unit_scale=True,
-                        unit_divisor=1024,
-                        miniters=1,
-                        leave=True,  # 完成后不保留显示
-                        mininterval=0.1,  # 最小更新间隔
+            # 存在上次中断留下的临时文件时，校验通过后通过Range请求续传剩余部分
+            # 流标识使用不含签名参数的URL路径，每次获取的下载链接签名不同
+            resume_key = urlsplit(url).path
+            resume_from, resume_info = self._check_resume(file_path, resume_key)
+            if resume_info is not None and resume_from == resume_info["total"]:
+                # 上次已下载完成，但合并或重命名前被中断
+                print(f"{file_type}已下载完成，跳过: {title}")
+                return True
+            request_headers = headers
+            if resume_from > 0:
+                request_headers = {**headers, "Range": f"bytes={resume_from}-"}
+                # 服务器文件已变化时If-Range使其返回完整内容(200)而不是续传
+                if "etag" in resume_info:
+                    request_headers["If-Range"] = resume_info["etag"]
+
+            # 流式下载 (复用共享的下载连接池)
+            async with self.download_client.stream(
+                "GET", url, headers=request_headers, follow_redirects=True
+            ) as response:
+                # 416或返回范围与续传信息不符: 服务器文件与临时文件不一致，删除后重新下载
+                content_range = response.headers.get("Content-Range", "")
+                if resume_from > 0 and (
+                    response.status_code == 416
+                    or response.status_code == 206
+                    and not (
+                        content_range.startswith(f"bytes {resume_from}-")
+                        and content_range.endswith(f"/{resume_info['total']}")
+                    )
+                ):
+                    print(f"临时文件与服务器文件不一致，重新下载{file_type}: {title}")
+                    self._remove_partial_download(file_path)
+                    return await self.download_file(
+                        url, file_path, title, file_type, headers
                     )
 
-                    try:
-                        # 初始化进度条
-                        pbar.update(0)
+                response.raise_for_status()
+
+                # 206: 服务器支持续传，从临时文件末尾继续写入
+                # 200: 服务器忽略了Range请求，从头重新下载
+                if response.status_code != 206:
+                    resume_from = 0
+                elif resume_from > 0:
+                    print(f"继续下载{file_type}: 已有 {resume_from} 字节")
+
+                # 响应声明的内容长度 (从头下载时即文件总大小，用于记录续传信息)
+                content_length = int(response.headers.get("Content-Length", 0))
+                total_size = content_length
+
+                # 处理无效的文件大小
+                if total_size <= 0:
+                    # 尝试从Content-Range头获取文件大小
+                    if "Content-Range" in response.headers:
+                        try:
+                            total_size = int(
+                                response.headers["Content-Range"].split("/")[-1]
+                            ) - resume_from
+                        except:
+                            # 如果无法确定文件大小，使用默认值
+                            total_size = 1024 * 1024  # 1MB
+                    else:
+                        total_size = 1024 * 1024  # 1MB
+
+                # 创建进度条 (续传时从已有大小开始显示)
+                pbar = tqdm(
+                    total=resume_from + total_size,
+                    initial=resume_from,
+                    desc=f"{file_type}下载: {title[:30]}",  # 限制标题长度
+                    unit="B",
+                    unit_scale=True,
+                    unit_divisor=1024,
+                    miniters=1,
+                    leave=True,  # 完成后不保留显示
+                    mininterval=0.1,  # 最小更新间隔
+                )
 
-                        # 下载文件
-                        downloaded_size = 0
-                        with open(file_path, "wb") as f:
-                            async for chunk in response.aiter_bytes(chunk_size=8192):
+                try:
+                    # 初始化进度条
+                    pbar.update(0)
+
+                    # 下载文件 (数据块较大，直接写入文件无需再经过Python缓冲区)
+                    # 不预分配磁盘空间，文件大小始终等于已写入的数据量，可直接作为续传位置
+                    # (exFAT/FAT等文件系统上posix_fallocate会逐块写入，反而更慢)
+                    # 磁盘写入在线程中进行，写入当前数据块的同时接收下一块
+                    downloaded_size = 0
+                    write_task = None
+                    with open(
+                        file_path, "r+b" if resume_from else "wb", buffering=0
+                    ) as f:
+                        f.seek(resume_from)
+                        # 从头下载时在清空旧数据后记录续传信息，中断后据此校验临时文件
+                        if resume_from == 0:
+                            self._save_resume_info(
+                                file_path,
+                                resume_key,
+                                content_length,
+                                response.headers.get("ETag"),
+                            )
+                        try:
+                            # 累计已下载字节，按时间间隔批量更新进度条
+                            pending_size = 0
+                            last_report = time.monotonic()
+                            async for chunk in response.aiter_bytes(
+                                chunk_size=DOWNLOAD_CHUNK_SIZE
+                            ):
                                 if interrupted:  # 检查中断
                                     return False
-                                f.write(chunk)
+                                # 保证写入顺序，同一文件只有一个写入在进行
+                                if write_task is not None:
+                                    await write_task
+                                write_task = asyncio.create_task(
+                                    asyncio.to_thread(write_fully, f, chunk)
+                                )
                                 chunk_size = len(chunk)
-                                pbar.update(chunk_size)
                                 downloaded_size += chunk_size
+                                pending_size += chunk_size
+
+                                now = time.monotonic()
+                                if now - last_report >= PROGRESS_UPDATE_INTERVAL:
+                                    pbar.update(pending_size)
+                                    pending_size = 0
+                                    last_report = now
+
+                            if write_task is not None:
+                                await write_task
+                            if pending_size:
+                                pbar.update(pending_size)
+                        finally:
+                            # 等待未完成的写入结束后再关闭文件
+                            if write_task is not None and not write_task.done():
+                                await asyncio.wait((write_task,))
+
+                    # 确保进度条完成
+                    if downloaded_size < total_size:
+                        pbar.update(total_size - downloaded_size)
 
-                        # 确保进度条完成
-                        if downloaded_size < total_size:
-                            pbar.update(total_size - downloaded_size)
-
-                        return True
-                    finally:
-                        # 关闭进度条
-                        pbar.close()
+                    return True
+                finally:
+                    # 关闭进度条
+                    pbar.close()
 
+        except httpx.HTTPError as e:
+            # 网络错误时保留已下载的部分，下次运行可续传
+            print(f"下载{file_type}失败: {title} - {str(e)}")
+            return False
         except Exception as e:
             print(f"下载{file_type}失败: {title} - {str(e)}")
-            # 删除不完整的文件
-            if os.path.exists(file_path):
-                try:
-                    os.remove(file_path)
-                except:
-                    pass
+            # 删除不完整的文件及其续传信息
+            try:
+                self._remove_partial_download(file_path)
+            except Exception:
+                pass
             return False
 
     async def download_single_video(
@@ -1282,6 +2093,7 @@ class BiliFavDownloader:
         output_path: str,
         quality: int,
         overwrite: bool = False,
+        pages: Optional[List[Dict]] = None,
     ) -> bool:
         """
         下载单个视频
@@ -1292,6 +2104,7 @@ class BiliFavDownloader:
             output_path: 输出目录
             quality: 清晰度代码
             overwrite: 是否覆盖已存在文件
+            pages: 预先获取的分P信息(可选，未提供时在此获取)
         返回:
             bool: 下载是否成功
         """
@@ -1299,7 +2112,8 @@ class BiliFavDownloader:
 
         try:
             # 获取视频的所有分P信息
-            pages = await self.get_video_pages(session, bvid)
+            if pages is None:
+                pages = await self.get_video_pages(session, bvid)
             if not pages:
                 print(f"跳过视频: {title} ({bvid}) - 无法获取视频信息")
                 return False
@@ -1324,7 +2138,7 @@ class BiliFavDownloader:
                 print("  [混合] 混合选择 (如: 1,3,5-7)")
                 print("请输入选择 (默认下载所有): ", end="", flush=True)
 
-                choice = input().strip()
+                choice = (await ainput()).strip()
 
                 # 解析用户选择
                 selected_indices = self.parse_page_selection(choice, len(pages))
@@ -1337,9 +2151,10 @@ class BiliFavDownloader:
                         print("取消下载")
                         return False
 
-                # 根据选择的索引获取对应的分P
+                # 根据选择的索引获取对应的分P (CID, 分P标题, 文件名使用的标题)
+                part_titles = self._part_titles(pages)
                 selected_cids = [
-                    (pages[idx - 1]["cid"], pages[idx - 1].get("part", f"分P{idx}"))
+                    (pages[idx - 1]["cid"], *part_titles[idx - 1])
                     for idx in selected_indices
                 ]
                 print(
@@ -1347,105 +2162,172 @@ class BiliFavDownloader:
                 )
             else:
                 # 单分P视频
-                selected_cids = [(pages[0]["cid"], title)]
+                selected_cids = [(pages[0]["cid"], title, title)]
+
+            # 获取下载请求头 (各分P共用)
+            headers = self._get_download_headers(session)
+
+            # 并发下载选中的分P，同时进行的分P数受信号量限制
+            semaphore = asyncio.Semaphore(MAX_PART_DOWNLOADS)
+            results = await asyncio.gather(
+                *(
+                    self._download_part(
+                        session,
+                        bvid,
+                        cid,
+                        part_title,
+                        file_title,
+                        output_path,
+                        quality,
+                        overwrite,
+                        headers,
+                        semaphore,
+                    )
+                    for cid, part_title, file_title in selected_cids
+                ),
+                return_exceptions=True,
+            )
 
-            # 下载选中的分P
             success_count = 0
-            for cid, part_title in selected_cids:
-                if interrupted:
-                    break
+            for (cid, part_title, _), result in zip(selected_cids, results):
+                if isinstance(result, Exception):
+                    print(f"下载失败: {part_title} ({bvid}) - {str(result)}")
+                elif result:
+                    success_count += 1
 
-                # 为每个分P生成独立的文件名
-                safe_title = sanitize_filename(part_title)
-                safe_title = shorten_filename(safe_title)
-                file_path = os.path.join(output_path, f"{safe_title}_{bvid}.mp4")
-
-                # 处理已存在文件
-                if overwrite and os.path.exists(file_path):
-                    try:
-                        os.remove(file_path)
-                        print(f"已删除旧文件: {part_title} ({bvid})")
-                    except Exception as e:
-                        print(f"删除旧文件失败: {part_title} ({bvid}) - {str(e)}")
-                        continue
+            return success_count > 0
 
-                # 获取媒体URL
-                media_info = await self.get_video_url(session, bvid, cid, quality)
-                if not media_info:
-                    print(f"跳过分P: {part_title} ({bvid}) - 无法获取下载链接")
-                    continue
+        except Exception as e:
+            print(f"下载失败: {title} ({bvid}) - {str(e)}")
+            return False
 
-                # 创建输出目录
-                os.makedirs(output_path, exist_ok=True)
+    @staticmethod
+    def _part_titles(pages: List[Dict]) -> List[Tuple[str, str]]:
+        """
+        生成各分P的标题及文件名使用的标题
+        分P标题可能重复(如空标题或相同名称)，重复时在文件名中加上分P序号，
+        避免并发下载的分P写入同一个临时文件和输出文件
+        返回:
+            List[Tuple]: [(分P标题, 文件名使用的标题), ...]，与pages顺序一致
+        """
+        part_titles = [
+            page.get("part", f"分P{i}") for i, page in enumerate(pages, 1)
+        ]
+        name_counts = Counter(safe_filename(part) for part in part_titles)
+        return [
+            (part, f"{part}_p{i}" if name_counts[safe_filename(part)] > 1 else part)
+            for i, part in enumerate(part_titles, 1)
+        ]
+
+    async def _download_part(
+        self,
+        session: httpx.AsyncClient,
+        bvid: str,
+        cid: int,
+        part_title: str,
+        file_title: str,
+        output_path: str,
+        quality: int,
+        overwrite: bool,
+        headers: Dict,
+        semaphore: asyncio.Semaphore,
+    ) -> bool:
+        """
+        下载视频的单个分P，DASH格式的音视频加入合并队列
+        参数:
+            file_title: 生成文件名使用的标题 (分P标题重复时带有分P序号)
+            semaphore: 限制同时下载的分P数
+        返回:
+            bool: 下载是否成功(已加入合并队列也视为成功)
+        """
+        async with semaphore:
+            if interrupted:
+                return False
+
+            # 为每个分P生成独立的文件名
+            safe_title = safe_filename(file_title)
+            file_path = os.path.join(output_path, f"{safe_title}_{bvid}.mp4")
+            video_file = os.path.join(output_path, f"{safe_title}_{bvid}_video.tmp")
+            audio_file = os.path.join(output_path, f"{safe_title}_{bvid}_audio.tmp")
+
+            # 处理已存在文件 (直接尝试删除，文件不存在时忽略)
+            # 覆盖时同时删除上次中断留下的临时文件，不再续传
+            if overwrite:
+                try:
+                    os.remove(file_path)
+                    print(f"已删除旧文件: {part_title} ({bvid})")
+                except FileNotFoundError:
+                    pass
+                except Exception as e:
+                    print(f"删除旧文件失败: {part_title} ({bvid}) - {str(e)}")
+                    return False
+                try:
+                    self._remove_partial_download(video_file)
+                    self._remove_partial_download(audio_file)
+                except Exception as e:
+                    print(f"删除临时文件失败: {part_title} ({bvid}) - {str(e)}")
+                    return False
 
-                # 构建请求头
-                headers = {
-                    "User-Agent": HEADERS["User-Agent"],
-                    "Referer": "https://www.bilibili.com",
-                    "Cookie": "; ".join(
-                        [f"{k}={v}" for k, v in session.cookies.items()]
-                    ),
-                }
+            # 获取媒体URL
+            media_info = await self.get_video_url(session, bvid, cid, quality)
+            if not media_info:
+                print(f"跳过分P: {part_title} ({bvid}) - 无法获取下载链接")
+                return False
 
-                # 下载视频文件
-                video_url = media_info["video_url"]
-                video_file = os.path.join(output_path, f"{safe_title}_{bvid}_video.tmp")
+            # 创建输出目录
+            os.makedirs(output_path, exist_ok=True)
 
-                # 下载视频
-                video_success = await self.download_file(
-                    video_url, video_file, part_title, "视频", headers
-                )
+            # 下载视频文件
+            video_url = media_info["video_url"]
 
-                if not video_success:
-                    continue
+            # 下载视频
+            video_success = await self.download_file(
+                video_url, video_file, part_title, "视频", headers
+            )
 
-                # 下载音频文件（如果是DASH格式）
-                audio_file = None
-                audio_success = True
+            if not video_success:
+                return False
 
-                if media_info["audio_url"] and self.ffmpeg_available:
-                    audio_url = media_info["audio_url"]
-                    audio_file = os.path.join(
-                        output_path, f"{safe_title}_{bvid}_audio.tmp"
-                    )
+            # 下载音频文件（如果是DASH格式）
+            audio_success = True
 
-                    # 下载音频
-                    audio_success = await self.download_file(
-                        audio_url, audio_file, part_title, "音频", headers
-                    )
+            if media_info["audio_url"] and self.ffmpeg_available:
+                audio_url = media_info["audio_url"]
 
-                # 处理音频下载失败情况
-                if not audio_success:
-                    if os.path.exists(video_file):
-                        try:
-                            os.rename(video_file, file_path)
-                            print(f"音频下载失败，已保存视频文件: {part_title}")
-                            success_count += 1
-                        except Exception as e:
-                            print(f"重命名视频文件失败: {part_title} - {str(e)}")
-                    continue
+                # 下载音频
+                audio_success = await self.download_file(
+                    audio_url, audio_file, part_title, "音频", headers
+                )
+            else:
+                audio_file = None
 
-                # 处理音视频合并
-                if audio_file and os.path.exists(audio_file):
-                    # 加入合并队列
-                    if self.queue_merge_task(
-                        video_file, audio_file, file_path, part_title, bvid
-                    ):
-                        success_count += 1
-                else:
-                    # 非DASH格式，直接重命名视频文件
-                    if os.path.exists(video_file):
-                        try:
-                            os.rename(video_file, file_path)
-                            print(f"下载完成: {part_title} ({bvid})")
-                            success_count += 1
-                        except Exception as e:
-                            print(f"重命名视频文件失败: {part_title} - {str(e)}")
+            # 到这里视频文件已下载成功，无需再检查文件是否存在
+            # 处理音频下载失败情况
+            if not audio_success:
+                try:
+                    self._finish_partial_download(video_file, file_path)
+                    print(f"音频下载失败，已保存视频文件: {part_title}")
+                    # 输出文件已存在，下次运行会跳过该视频，不完整的音频不再续传
+                    self._remove_partial_download(audio_file)
+                    return True
+                except Exception as e:
+                    print(f"重命名视频文件失败: {part_title} - {str(e)}")
+                return False
 
-            return success_count > 0
+            # 处理音视频合并
+            if audio_file:
+                # 加入合并队列 (合并队列只在事件循环中访问，无需加锁)
+                return self.queue_merge_task(
+                    video_file, audio_file, file_path, part_title, bvid
+                )
 
-        except Exception as e:
-            print(f"下载失败: {title} ({bvid}) - {str(e)}")
+            # 非DASH格式，直接重命名视频文件
+            try:
+                self._finish_partial_download(video_file, file_path)
+                print(f"下载完成: {part_title} ({bvid})")
+                return True
+            except Exception as e:
+                print(f"重命名视频文件失败: {part_title} - {str(e)}")
             return False
 
     async def download_favorite_videos(
@@ -1492,21 +2374,30 @@ class BiliFavDownloader:
         overwrite_all = False
         skip_existing = False
 
+        # 一次列出输出目录中的文件，之后用集合判断文件是否存在，无需逐个查询
+        with os.scandir(output_path) as entries:
+            existing_files = {entry.name for entry in entries}
+
         download_tasks = []  # 下载任务列表
+        page_hints = {}  # 收藏夹列表中已包含分P信息的单分P视频 (BV号 -> 分P列表)
         skipped_count = 0  # 跳过的视频数
         overwritten_count = 0  # 覆盖的视频数
         new_videos = 0  # 新增的视频数
 
         # 遍历所有视频，处理文件存在情况
-        for title, bvid in videos:
+        for title, bvid, page_count, cid, duration in videos:
             if interrupted:
                 break
 
+            # 单分P视频直接使用收藏夹列表中的CID，无需再请求视频信息
+            if page_count == 1 and cid:
+                page_hints[bvid] = [
+                    {"cid": cid, "page": 1, "part": title, "duration": duration or 0}
+                ]
+
             # 构建安全文件名
-            safe_title = sanitize_filename(title)
-            safe_title = shorten_filename(safe_title)
-            file_path = os.path.join(output_path, f"{safe_title}_{bvid}.mp4")
-            file_exists = os.path.exists(file_path)
+            safe_title = safe_filename(title)
+            file_exists = f"{safe_title}_{bvid}.mp4" in existing_files
 
             # 处理跳过所有已存在文件的情况
             if file_exists and skip_existing:
@@ -1527,7 +2418,7 @@ class BiliFavDownloader:
                     end="",
                     flush=True,
                 )
-                choice = input().strip().lower()
+                choice = (await ainput()).strip().lower()
                 if not choice:
                     choice = "s"
 
@@ -1571,27 +2462,48 @@ class BiliFavDownloader:
             print("没有需要下载的视频")
             return
 
+        # 后台按顺序预取后续视频的分P信息，与当前视频的下载重叠进行
+        # 队列容量限制预取数量，每项为一个获取分P信息的任务 (已有分P信息的视频跳过)
+        pages_queue = asyncio.Queue(maxsize=VIDEO_PREFETCH_COUNT)
+
+        async def prefetch_pages():
+            for bvid, _, _ in download_tasks:
+                if bvid in page_hints:
+                    continue
+                await pages_queue.put(
+                    asyncio.create_task(self.get_video_pages(session, bvid))
+                )
+
+        prefetch_task = asyncio.create_task(prefetch_pages())
+
         # 执行下载任务
         results = []
-        for i, (bvid, title, overwrite) in enumerate(download_tasks, 1):
-            if interrupted:
-                break
+        try:
+            for i, (bvid, title, overwrite) in enumerate(download_tasks, 1):
+                if interrupted:
+                    break
 
-            print(f"\n[{i}/{len(download_tasks)}] 开始处理视频: {title} ({bvid})")
-            result = await self.download_single_video(
-                session, bvid, title, output_path, quality_code, overwrite
-            )
-            results.append(result)
+                pages = page_hints.get(bvid)
+                if pages is None:
+                    pages = await (await pages_queue.get())
+                print(f"\n[{i}/{len(download_tasks)}] 开始处理视频: {title} ({bvid})")
+                result = await self.download_single_video(
+                    session, bvid, title, output_path, quality_code, overwrite, pages
+                )
+                results.append(result)
+        finally:
+            # 中断时取消尚未使用的预取任务
+            prefetch_task.cancel()
+            while not pages_queue.empty():
+                pages_queue.get_nowait().cancel()
 
         # 等待合并队列完成
-        while self.merge_queue and not interrupted:
-            queue_size = len(self.merge_queue)
-            print(f"等待合并队列完成: 剩余 {queue_size} 个任务...")
-            if queue_size > 0:
-                print(
-                    f"下一个任务: {self.merge_queue[0][3]} ({self.merge_queue[0][4]})"
-                )
-            await asyncio.sleep(5)
+        while self.pending_merge_count() and not interrupted:
+            print(f"等待合并队列完成: 剩余 {self.pending_merge_count()} 个任务...")
+            try:
+                await asyncio.wait_for(self.merge_queue.join(), timeout=5)
+            except asyncio.TimeoutError:
+                pass
 
         # 统计结果
         success_count = sum(1 for r in results if r)
@@ -1599,14 +2511,18 @@ class BiliFavDownloader:
 
         # 打印最终结果
         if not interrupted:
-            print(f"\n收藏夹下载完成: {folder_title}")
-            print(f" - 成功: {success_count} 个视频")
+            # 汇总为一次输出，避免与合并任务的输出交错
+            lines = [
+                f"\n收藏夹下载完成: {folder_title}",
+                f" - 成功: {success_count} 个视频",
+            ]
             if failed_count > 0:
-                print(f" - 失败: {failed_count} 个视频")
+                lines.append(f" - 失败: {failed_count} 个视频")
             if skipped_count > 0:
-                print(f" - 跳过: {skipped_count} 个已存在视频")
+                lines.append(f" - 跳过: {skipped_count} 个已存在视频")
             if new_videos > 0:
-                print(f" - 新增: {new_videos} 个新视频")
+                lines.append(f" - 新增: {new_videos} 个新视频")
+            print("\n".join(lines))
 
     async def fetch_and_update_favorites(self, session: httpx.AsyncClient) -> bool:
         """
@@ -1619,7 +2535,8 @@ class BiliFavDownloader:
         global interrupted
 
         # 升级数据库结构
-        self.upgrade_database()
+        with self._db_lock:
+            self.upgrade_database()
 
         # 决定是否更新数据
         default_choice = "n"
@@ -1643,19 +2560,16 @@ class BiliFavDownloader:
             print("\n检测到本地数据库存在")
 
             update = (
-                input(
+                await ainput(
                     f"是否更新收藏夹数据? (y/n, 默认{default_choice}{update_reason}): "
                 )
-                .strip()
-                .lower()
-                or default_choice
-            )
+            ).strip().lower() or default_choice
 
             if update == "y":
                 print("从B站API获取最新收藏夹数据...")
             else:
                 print("使用本地数据库数据")
-                return self.load_from_db()  # 从数据库加载
+                return await self.load_from_db()  # 从数据库加载
         else:
             print("从B站API获取收藏夹数据...")
 
@@ -1664,35 +2578,41 @@ class BiliFavDownloader:
         if not favorites:
             return False
 
-        # 获取每个收藏夹的详细内容
-        self.all_data = []
-        for fav in favorites:
-            if interrupted:
-                break
+        # 并发获取每个收藏夹的详细内容 (请求速率由共享的限速器统一控制)
+        semaphore = asyncio.Semaphore(MAX_FAVORITE_FETCHES)
 
-            # 随机延迟防止请求过快
-            delay = random.uniform(0.1, 0.8)
-            await asyncio.sleep(delay)
+        async def fetch_one(fav: Dict) -> Optional[Dict]:
+            async with semaphore:
+                if interrupted:
+                    return None
 
-            print(
-                f"\n正在获取收藏夹: {fav['title']} (ID: {fav['id']}, 应有 {fav['media_count']} 项)"
-            )
+                print(
+                    f"\n正在获取收藏夹: {fav['title']} (ID: {fav['id']}, 应有 {fav['media_count']} 项)"
+                )
 
-            try:
                 # 获取收藏夹内容
                 items = await self.get_favorite_detail(
                     session, fav["id"], fav["media_count"]
                 )
-                self.all_data.append(
-                    {
-                        "id": fav["id"],
-                        "title": fav["title"],
-                        "media_count": fav["media_count"],
-                        "items": items,
-                    }
-                )
-            except Exception as e:
-                print(f"  └─ 获取失败: {str(e)}")
+                return {
+                    "id": fav["id"],
+                    "title": fav["title"],
+                    "media_count": fav["media_count"],
+                    "items": items,
+                }
+
+        results = await asyncio.gather(
+            *(fetch_one(fav) for fav in favorites), return_exceptions=True
+        )
+
+        # 按收藏夹列表顺序收集结果
+        self.all_data = []
+        for fav, result in zip(favorites, results):
+            if isinstance(result, Exception):
+                print(f"获取收藏夹 {fav['title']} 失败: {str(result)}")
+            elif result:
+                self.all_data.append(result)
+        self._folders_by_id = {folder["id"]: folder for folder in self.all_data}
 
         # 保存到数据库
         if not interrupted and self.all_data:
@@ -1702,57 +2622,72 @@ class BiliFavDownloader:
         else:
             return False
 
-    def load_from_db(self) -> bool:
-        """从数据库加载收藏夹数据"""
-        try:
-            conn = sqlite3.connect(DB_FILE)
-            c = conn.cursor()
+    async def load_from_db(self) -> bool:
+        """从数据库加载收藏夹数据 (在后台线程中执行，不阻塞事件循环)"""
+        return await asyncio.to_thread(self._load_from_db_sync)
 
-            # 查询收藏夹
-            c.execute("SELECT id, title, media_id, count, last_updated FROM favorites")
-            folders = c.fetchall()
+    def _load_from_db_sync(self) -> bool:
+        """从数据库加载收藏夹数据的同步实现，与写操作共用数据库锁"""
+        with self._db_lock:
+            # 旧版数据库缺少last_updated、page_count等字段，读取前先升级结构
+            # (非交互模式不经过fetch_and_update_favorites，不会在别处升级)
+            if self.db_exists:
+                self.upgrade_database()
 
-            self.all_data = []
-            # 处理每个收藏夹
-            for folder in folders:
-                # 查询收藏项
-                c.execute(
-                    "SELECT title, bvid, owner_name FROM favorite_items WHERE favorite_id=?",
-                    (folder[0],),
-                )
-                items_rows = c.fetchall()
-                items = [
-                    {
-                        "title": row[0],
-                        "bvid": row[1],
-                        "upper": {"name": row[2]},  # 构建类似API的结构
-                    }
-                    for row in items_rows
-                ]
+            try:
+                c = self._get_db().cursor()
+
+                # 查询收藏夹
+                c.execute(SQL_SELECT_FAVORITES)
+                folders = c.fetchall()
+
+                # 一次查询全部收藏项，在内存中按收藏夹分组
+                items_by_folder = defaultdict(list)
+                c.execute(SQL_SELECT_ALL_FAVORITE_ITEMS)
+                for favorite_id, title, bvid, owner_name in c:
+                    items_by_folder[favorite_id].append(
+                        {
+                            "title": title,
+                            "bvid": bvid,
+                            "upper": {"name": owner_name},  # 构建类似API的结构
+                        }
+                    )
 
-                # 添加到数据列表
-                self.all_data.append(
-                    {
-                        "id": folder[0],
-                        "title": folder[1],
-                        "media_id": folder[2],
-                        "media_count": folder[3],
-                        "last_updated": folder[4],
-                        "items": items,
-                    }
-                )
+                self.all_data = []
+                # 处理每个收藏夹
+                for folder in folders:
+                    items = items_by_folder.get(folder[0], [])
+
+                    # 添加到数据列表
+                    self.all_data.append(
+                        {
+                            "id": folder[0],
+                            "title": folder[1],
+                            "media_id": folder[2],
+                            "media_count": folder[3],
+                            "last_updated": folder[4],
+                            "items": items,
+                        }
+                    )
 
-            print(f"成功加载 {len(self.all_data)} 个收藏夹")
-            return True
-        except Exception as e:
-            print(f"数据库加载失败: {str(e)}")
-            return False
-        finally:
-            if conn:
-                conn.close()
+                self._folders_by_id = {
+                    folder["id"]: folder for folder in self.all_data
+                }
+                print(f"成功加载 {len(self.all_data)} 个收藏夹")
+                return True
+            except Exception as e:
+                print(f"数据库加载失败: {str(e)}")
+                return False
 
     async def run(self):
         """下载器主运行方法"""
+        try:
+            await self._run_interactive()
+        finally:
+            await self.close()
+
+    async def _run_interactive(self):
+        """交互式主流程"""
         global interrupted
 
         # 打印欢迎信息
@@ -1781,134 +2716,75 @@ class BiliFavDownloader:
             print("初始化后检测到中断，退出程序")
             return
 
-        # 创建HTTP会话
-        async with httpx.AsyncClient(
-            headers=HEADERS, cookies=self.cookies, timeout=60.0
-        ) as session:
-            # 再次检查中断
-            if interrupted:
-                print("初始化后检测到中断，退出程序")
-                return
-
-            # 主操作循环
-            while not interrupted:
-                print("\n请选择操作: 1. 下载收藏夹视频  2. 直接下载视频  3. 退出")
-                print("请输入选项 (默认1): ", end="")
+        # 使用共享的HTTP会话
+        session = self.client
 
-                choice = input().strip()
-                if not choice:
-                    choice = "1"
+        # 主操作循环
+        while not interrupted:
+            print("\n请选择操作: 1. 下载收藏夹视频  2. 直接下载视频  3. 退出")
+            print("请输入选项 (默认1): ", end="")
 
-                if choice == "1":
-                    # 获取并更新收藏夹数据
-                    success = await self.fetch_and_update_favorites(session)
+            choice = (await ainput()).strip()
+            if not choice:
+                choice = "1"
 
-                    if interrupted:
-                        print("获取收藏夹后检测到中断，退出程序")
-                        break
+            if choice == "1":
+                # 获取并更新收藏夹数据
+                success = await self.fetch_and_update_favorites(session)
 
-                    # 显示收藏夹内容
-                    if success and self.all_data:
-                        print("\n收藏夹内容:")
-                        self.print_tree(self.all_data)
+                if interrupted:
+                    print("获取收藏夹后检测到中断，退出程序")
+                    break
 
-                        # 显示收藏夹列表
-                        print("\n收藏夹列表:")
-                        for folder in self.all_data:
-                            print(
-                                f"ID: {folder['id']} - {folder['title']} ({folder['media_count']}项)"
-                            )
+                # 显示收藏夹内容
+                if success and self.all_data:
+                    print("\n收藏夹内容:")
+                    self.print_tree(self.all_data)
 
-                        # 获取用户选择的收藏夹ID
-                        print("\n请输入要下载的收藏夹ID: ", end="")
-                        fav_id = input().strip()
-                        if not fav_id.isdigit():
-                            print("输入错误，请重新输入")
-                            continue
-                        fav_id = int(fav_id)
-
-                        # 验证收藏夹ID是否存在
-                        found = False
-                        for folder in self.all_data:
-                            if folder["id"] == fav_id:
-                                found = True
-                                break
-                        if not found:
-                            print("收藏夹ID不存在")
-                            continue
-
-                        # 创建清晰度选项列表
-                        quality_options = list(QUALITY_MAP.keys())
-
-                        # 显示清晰度选项
-                        print("\n可用清晰度:")
-                        for i, q in enumerate(quality_options, 1):
-                            print(f"{i}. {q}")
-
-                        # 获取用户选择的清晰度
-                        default_quality_index = (
-                            quality_options.index("1080P") + 1
-                            if "1080P" in quality_options
-                            else 4
-                        )
+                    # 显示收藏夹列表
+                    print("\n收藏夹列表:")
+                    for folder in self.all_data:
                         print(
-                            f"请选择清晰度 (1-{len(quality_options)}, 默认{default_quality_index}): ",
-                            end="",
+                            f"ID: {folder['id']} - {folder['title']} ({folder['media_count']}项)"
                         )
-                        quality_choice = input().strip()
-
-                        # 处理默认值
-                        if not quality_choice:
-                            quality_choice = str(default_quality_index)
-
-                        # 验证并获取清晰度
-                        if quality_choice.isdigit():
-                            choice_index = int(quality_choice) - 1
-                            if 0 <= choice_index < len(quality_options):
-                                quality = quality_options[choice_index]
-                            else:
-                                print(
-                                    f"输入超出范围，使用默认{quality_options[default_quality_index - 1]}"
-                                )
-                                quality = quality_options[default_quality_index - 1]
-                        else:
-                            print(
-                                f"无效输入，使用默认{quality_options[default_quality_index - 1]}"
-                            )
-                            quality = quality_options[default_quality_index - 1]
-
-                        # 非会员清晰度调整
-                        if (
-                            not self.is_member
-                            and QUALITY_MAP.get(quality, 0) > NON_MEMBER_MAX_QUALITY
-                        ):
-                            print(f"普通账号最高支持1080P，已自动调整为1080P")
-                            quality = "1080P"
-
-                        # 获取输出目录
-                        print("请输入下载路径 (默认./favourite_download): ", end="")
-                        output_dir = input().strip() or "./favourite_download"
-
-                        # 开始下载
-                        if interrupted:
-                            print("开始下载前检测到中断，退出程序")
-                            break
-
-                        await self.download_favorite_videos(
-                            session, fav_id, output_dir, quality
-                        )
-                    else:
-                        print("未能获取收藏夹数据")
-                elif choice == "2":
-                    await self.download_single_video_direct(session)
-                elif choice == "3":
-                    print("退出程序")
-                    break
-                else:
-                    print("无效选项，请重新输入")
 
-        # 停止合并线程
-        self.stop_merge_thread()
+                    # 获取用户选择的收藏夹ID
+                    print("\n请输入要下载的收藏夹ID: ", end="")
+                    fav_id = (await ainput()).strip()
+                    if not fav_id.isdigit():
+                        print("输入错误，请重新输入")
+                        continue
+                    fav_id = int(fav_id)
+
+                    # 验证收藏夹ID是否存在
+                    if fav_id not in self._folders_by_id:
+                        print("收藏夹ID不存在")
+                        continue
+
+                    # 选择清晰度
+                    quality = await self._prompt_quality()
+
+                    # 获取输出目录
+                    print("请输入下载路径 (默认./favourite_download): ", end="")
+                    output_dir = (await ainput()).strip() or "./favourite_download"
+
+                    # 开始下载
+                    if interrupted:
+                        print("开始下载前检测到中断，退出程序")
+                        break
+
+                    await self.download_favorite_videos(
+                        session, fav_id, output_dir, quality
+                    )
+                else:
+                    print("未能获取收藏夹数据")
+            elif choice == "2":
+                await self.download_single_video_direct(session)
+            elif choice == "3":
+                print("退出程序")
+                break
+            else:
+                print("无效选项，请重新输入")
 
     async def run_non_interactive(self, mode: str, **kwargs):
         """
@@ -1917,6 +2793,13 @@ class BiliFavDownloader:
             mode: 运行模式 ('favorite', 'direct', 'batch')
             **kwargs: 模式相关参数
         """
+        try:
+            await self._run_non_interactive(mode, **kwargs)
+        finally:
+            await self.close()
+
+    async def _run_non_interactive(self, mode: str, **kwargs):
+        """非交互式主流程"""
         global interrupted
 
         # 打印欢迎信息
@@ -1944,28 +2827,18 @@ class BiliFavDownloader:
             print("初始化后检测到中断，退出程序")
             return
 
-        # 创建HTTP会话
-        async with httpx.AsyncClient(
-            headers=HEADERS, cookies=self.cookies, timeout=60.0
-        ) as session:
-            # 再次检查中断
-            if interrupted:
-                print("初始化后检测到中断，退出程序")
-                return
-
-            # 根据模式执行相应操作
-            if mode == "favorite":
-                await self._run_favorite_mode(session, **kwargs)
-            elif mode == "direct":
-                await self._run_direct_mode(session, **kwargs)
-            elif mode == "batch":
-                await self._run_batch_mode(session, **kwargs)
-            else:
-                print(f"未知模式: {mode}")
-                return
+        # 使用共享的HTTP会话
+        session = self.client
 
-        # 停止合并线程
-        self.stop_merge_thread()
+        # 根据模式执行相应操作
+        if mode == "favorite":
+            await self._run_favorite_mode(session, **kwargs)
+        elif mode == "direct":
+            await self._run_direct_mode(session, **kwargs)
+        elif mode == "batch":
+            await self._run_batch_mode(session, **kwargs)
+        else:
+            print(f"未知模式: {mode}")
 
     async def _run_favorite_mode(
         self,
@@ -2008,7 +2881,7 @@ class BiliFavDownloader:
                 return
         else:
             print("使用本地数据库数据")
-            if not self.load_from_db():
+            if not await self.load_from_db():
                 print("加载数据库失败，尝试从API获取")
                 success = await self.fetch_and_update_favorites(session)
                 if not success:
@@ -2021,15 +2894,8 @@ class BiliFavDownloader:
             return
 
         # 验证收藏夹ID是否存在
-        found = False
-        target_favorite = None
-        for folder in self.all_data:
-            if folder["id"] == favorite_id:
-                found = True
-                target_favorite = folder
-                break
-
-        if not found:
+        target_favorite = self._folders_by_id.get(favorite_id)
+        if target_favorite is None:
             print(f"收藏夹ID {favorite_id} 不存在")
             # 显示可用的收藏夹
             print("\n可用的收藏夹:")
@@ -2118,9 +2984,14 @@ class BiliFavDownloader:
             # 获取清晰度代码
             quality_code = QUALITY_MAP.get(quality, 80)
 
-            # 下载视频
+            # 下载视频 (复用视频详情中的分P信息)
             await self.download_single_video(
-                session, bvid, title, output_dir, quality_code
+                session,
+                bvid,
+                title,
+                output_dir,
+                quality_code,
+                pages=self._pages_from_video_info(video_info),
             )
 
         elif video_identifier.isdigit():
@@ -2193,6 +3064,40 @@ class BiliFavDownloader:
         except Exception as e:
             print(f"处理批处理任务时发生错误: {e}")
 
+    async def _prompt_quality(self) -> str:
+        """
+        显示清晰度选项并读取用户选择
+        输入为空或无效时使用默认清晰度，非会员自动限制为1080P
+        返回:
+            str: 清晰度描述字符串
+        """
+        print(QUALITY_MENU)
+
+        default_quality = QUALITY_OPTIONS[DEFAULT_QUALITY_INDEX - 1]
+        print(
+            f"请选择清晰度 (1-{len(QUALITY_OPTIONS)}, 默认{DEFAULT_QUALITY_INDEX}): ",
+            end="",
+        )
+        quality_choice = (await ainput()).strip() or str(DEFAULT_QUALITY_INDEX)
+
+        # 验证并获取清晰度
+        if quality_choice.isdigit():
+            choice_index = int(quality_choice) - 1
+            if 0 <= choice_index < len(QUALITY_OPTIONS):
+                quality = QUALITY_OPTIONS[choice_index]
+            else:
+                print(f"输入超出范围，使用默认{default_quality}")
+                quality = default_quality
+        else:
+            print(f"无效输入，使用默认{default_quality}")
+            quality = default_quality
+
+        # 非会员清晰度调整
+        if not self.is_member and QUALITY_MAP.get(quality, 0) > NON_MEMBER_MAX_QUALITY:
+            print(f"普通账号最高支持1080P，已自动调整为1080P")
+            quality = "1080P"
+        return quality
+
     def extract_bvid_from_input(self, input_str: str) -> Optional[str]:
         """
         从用户输入中提取BV号
@@ -2219,16 +3124,10 @@ class BiliFavDownloader:
                 return input_str.split("?")[0]
             return input_str
 
-        # 2. 使用正则表达式从各种格式中提取BV号
-        import re
-
-        pattern = r"BV[a-zA-Z0-9]{10,}"
-        match = re.search(pattern, input_str)
+        # 2. 使用正则表达式从各种格式中提取BV号 (匹配结果必然是有效格式)
+        match = _BVID_RE.search(input_str)
         if match:
-            bvid = match.group()
-            # 验证提取的BV号是否有效
-            if bvid.startswith("BV") and len(bvid) >= 10:
-                return bvid
+            return match.group()
 
         # 3. 如果是纯数字，可能是CID，返回None让调用方处理
         if input_str.isdigit():
@@ -2254,7 +3153,7 @@ class BiliFavDownloader:
 
         while True:
             print("\n请输入视频标识 (输入'q'返回主菜单): ", end="")
-            video_input = input().strip()
+            video_input = (await ainput()).strip()
 
             if video_input.lower() == "q":
                 return
@@ -2294,44 +3193,11 @@ class BiliFavDownloader:
         print(f"视频标题: {title}")
 
         # 获取清晰度
-        quality_options = list(QUALITY_MAP.keys())
-        print("\n可用清晰度:")
-        for i, q in enumerate(quality_options, 1):
-            print(f"{i}. {q}")
-
-        default_quality_index = (
-            quality_options.index("1080P") + 1 if "1080P" in quality_options else 4
-        )
-        print(
-            f"请选择清晰度 (1-{len(quality_options)}, 默认{default_quality_index}): ",
-            end="",
-        )
-        quality_choice = input().strip()
-
-        if not quality_choice:
-            quality_choice = str(default_quality_index)
-
-        if quality_choice.isdigit():
-            choice_index = int(quality_choice) - 1
-            if 0 <= choice_index < len(quality_options):
-                quality = quality_options[choice_index]
-            else:
-                print(
-                    f"输入超出范围，使用默认{quality_options[default_quality_index - 1]}"
-                )
-                quality = quality_options[default_quality_index - 1]
-        else:
-            print(f"无效输入，使用默认{quality_options[default_quality_index - 1]}")
-            quality = quality_options[default_quality_index - 1]
-
-        # 非会员清晰度调整
-        if not self.is_member and QUALITY_MAP.get(quality, 0) > NON_MEMBER_MAX_QUALITY:
-            print(f"普通账号最高支持1080P，已自动调整为1080P")
-            quality = "1080P"
+        quality = await self._prompt_quality()
 
         # 获取输出目录
         print("请输入下载路径 (默认./direct_download): ", end="")
-        output_dir = input().strip() or "./direct_download"
+        output_dir = (await ainput()).strip() or "./direct_download"
 
         # 创建输出目录
         os.makedirs(output_dir, exist_ok=True)
@@ -2339,9 +3205,15 @@ class BiliFavDownloader:
         # 获取清晰度代码
         quality_code = QUALITY_MAP.get(quality, 80)
 
-        # 下载视频
+        # 下载视频 (复用视频详情中的分P信息)
         success = await self.download_single_video(
-            session, bvid, title, output_dir, quality_code, False
+            session,
+            bvid,
+            title,
+            output_dir,
+            quality_code,
+            False,
+            self._pages_from_video_info(video_info),
         )
 
         if success:
@@ -2355,7 +3227,7 @@ class BiliFavDownloader:
 
         print("通过CID下载功能需要BV号信息，请先提供BV号")
         print("请输入BV号: ", end="")
-        bvid = input().strip()
+        bvid = (await ainput()).strip()
 
         if not bvid.startswith("BV"):
             print("无效的BV号格式")
@@ -2367,63 +3239,31 @@ class BiliFavDownloader:
             print(f"无法获取视频信息: {bvid}")
             return
 
-        # 检查CID是否有效
-        pages = await self.get_video_pages(session, bvid)
-        valid_cids = [page["cid"] for page in pages]
+        # 检查CID是否有效 (分P信息已包含在视频详情中)
+        # 文件名与多分P下载时一致，两种方式下载的同一分P可以互相续传
+        pages = self._pages_from_video_info(video_info)
+        titles_by_cid = {
+            page["cid"]: titles
+            for page, titles in zip(pages, self._part_titles(pages))
+        }
 
-        if cid not in valid_cids:
+        titles = titles_by_cid.get(cid)
+        if titles is None:
             print(f"CID {cid} 在视频 {bvid} 中不存在")
-            print(f"有效的CID: {valid_cids}")
+            print(f"有效的CID: {list(titles_by_cid)}")
             return
 
-        # 找到对应的分P标题
-        part_title = "未知分P"
-        for page in pages:
-            if page["cid"] == cid:
-                part_title = page.get("part", "未知分P")
-                break
+        # 对应的分P标题及文件名使用的标题
+        part_title, file_title = titles
 
         print(f"找到分P: {part_title} (CID: {cid})")
 
         # 获取清晰度
-        quality_options = list(QUALITY_MAP.keys())
-        print("\n可用清晰度:")
-        for i, q in enumerate(quality_options, 1):
-            print(f"{i}. {q}")
-
-        default_quality_index = (
-            quality_options.index("1080P") + 1 if "1080P" in quality_options else 4
-        )
-        print(
-            f"请选择清晰度 (1-{len(quality_options)}, 默认{default_quality_index}): ",
-            end="",
-        )
-        quality_choice = input().strip()
-
-        if not quality_choice:
-            quality_choice = str(default_quality_index)
-
-        if quality_choice.isdigit():
-            choice_index = int(quality_choice) - 1
-            if 0 <= choice_index < len(quality_options):
-                quality = quality_options[choice_index]
-            else:
-                print(
-                    f"输入超出范围，使用默认{quality_options[default_quality_index - 1]}"
-                )
-                quality = quality_options[default_quality_index - 1]
-        else:
-            print(f"无效输入，使用默认{quality_options[default_quality_index - 1]}")
-            quality = quality_options[default_quality_index - 1]
-
-        # 非会员清晰度调整
-        if not self.is_member and QUALITY_MAP.get(quality, 0) > NON_MEMBER_MAX_QUALITY:
-            print(f"普通账号最高支持1080P，已自动调整为1080P")
-            quality = "1080P"
+        quality = await self._prompt_quality()
 
         # 获取输出目录
         print("请输入下载路径 (默认./direct_download): ", end="")
-        output_dir = input().strip() or "./direct_download"
+        output_dir = (await ainput()).strip() or "./direct_download"
 
         # 创建输出目录
         os.makedirs(output_dir, exist_ok=True)
@@ -2433,7 +3273,7 @@ class BiliFavDownloader:
 
         # 下载指定分P
         success = await self.download_single_video_by_cid(
-            session, bvid, cid, part_title, output_dir, quality_code
+            session, bvid, cid, part_title, file_title, output_dir, quality_code
         )
 
         if success:
@@ -2447,86 +3287,34 @@ class BiliFavDownloader:
         bvid: str,
         cid: int,
         title: str,
+        file_title: str,
         output_path: str,
         quality: int,
+        overwrite: bool = False,
     ) -> bool:
-        """通过CID下载单个分P视频"""
-        global interrupted
-
+        """
+        通过CID下载单个分P视频
+        与多分P下载共用分P下载流程，临时文件命名、续传与覆盖处理保持一致
+        参数:
+            title: 分P标题
+            file_title: 生成文件名使用的标题
+            overwrite: 是否覆盖已存在文件
+        """
         try:
-            # 为分P生成独立的文件名
-            safe_title = sanitize_filename(title)
-            safe_title = shorten_filename(safe_title)
-            file_path = os.path.join(output_path, f"{safe_title}_{bvid}.mp4")
-
-            # 获取媒体URL
-            media_info = await self.get_video_url(session, bvid, cid, quality)
-            if not media_info:
-                print(f"跳过分P: {title} ({bvid}) - 无法获取下载链接")
-                return False
-
-            # 构建请求头
-            headers = {
-                "User-Agent": HEADERS["User-Agent"],
-                "Referer": "https://www.bilibili.com",
-                "Cookie": "; ".join([f"{k}={v}" for k, v in session.cookies.items()]),
-            }
-
-            # 下载视频文件
-            video_url = media_info["video_url"]
-            video_file = os.path.join(output_path, f"{safe_title}_{bvid}_video.tmp")
-
-            # 下载视频
-            video_success = await self.download_file(
-                video_url, video_file, title, "视频", headers
+            # 获取下载请求头
+            headers = self._get_download_headers(session)
+            return await self._download_part(
+                session,
+                bvid,
+                cid,
+                title,
+                file_title,
+                output_path,
+                quality,
+                overwrite,
+                headers,
+                asyncio.Semaphore(1),
             )
-
-            if not video_success:
-                return False
-
-            # 下载音频文件（如果是DASH格式）
-            audio_file = None
-            audio_success = True
-
-            if media_info["audio_url"] and self.ffmpeg_available:
-                audio_url = media_info["audio_url"]
-                audio_file = os.path.join(output_path, f"{safe_title}_{bvid}_audio.tmp")
-
-                # 下载音频
-                audio_success = await self.download_file(
-                    audio_url, audio_file, title, "音频", headers
-                )
-
-            # 处理音频下载失败情况
-            if not audio_success:
-                if os.path.exists(video_file):
-                    try:
-                        os.rename(video_file, file_path)
-                        print(f"音频下载失败，已保存视频文件: {title}")
-                        return True
-                    except Exception as e:
-                        print(f"重命名视频文件失败: {title} - {str(e)}")
-                return False
-
-            # 处理音视频合并
-            if audio_file and os.path.exists(audio_file):
-                # 加入合并队列
-                if self.queue_merge_task(
-                    video_file, audio_file, file_path, title, bvid
-                ):
-                    return True
-            else:
-                # 非DASH格式，直接重命名视频文件
-                if os.path.exists(video_file):
-                    try:
-                        os.rename(video_file, file_path)
-                        print(f"下载完成: {title} ({bvid})")
-                        return True
-                    except Exception as e:
-                        print(f"重命名视频文件失败: {title} - {str(e)}")
-
-            return False
-
         except Exception as e:
             print(f"下载失败: {title} ({bvid}) - {str(e)}")
             return False
@@ -2571,7 +3359,7 @@ def load_config(config_path=None):
 
     try:
         # 加载TOML配置文件
-        config = toml.load(config_path)
+        config = load_toml_file(config_path)
         print(f"已加载配置文件: {config_path}")
         return config
     except Exception as e:
@@ -2720,7 +3508,7 @@ def parse_arguments():
     favorite_parser.add_argument(
         "--quality",
         type=str,
-        choices=list(QUALITY_MAP.keys()),
+        choices=QUALITY_OPTIONS,
         default="1080P",
         help="视频清晰度 (默认: 1080P)",
     )
@@ -2751,7 +3539,7 @@ def parse_arguments():
     direct_parser.add_argument(
         "--quality",
         type=str,
-        choices=list(QUALITY_MAP.keys()),
+        choices=QUALITY_OPTIONS,
         default="1080P",
         help="视频清晰度 (默认: 1080P)",
     )
@@ -2810,9 +3598,10 @@ if __name__ == "__main__":
     # 设置详细日志
     if merged_config.get("verbose", False) or args.verbose:
         logging.getLogger().setLevel(logging.DEBUG)
+        logger.setLevel(logging.DEBUG)
+        console_handler.setLevel(logging.DEBUG)
         print("详细日志已启用")
 
-    downloader = None
     try:
         # 创建下载器实例
         downloader = BiliFavDownloader()
@@ -2863,7 +3652,3 @@ if __name__ == "__main__":
 
     except Exception as e:
         print(f"程序发生错误: {str(e)}")
-    finally:
-        # 确保合并线程被停止
-        if downloader and hasattr(downloader, "stop_merge_thread"):
-            downloader.stop_merge_thread()